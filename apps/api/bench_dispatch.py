@@ -0,0 +1,54 @@
+"""Benchmark the delivery dispatch planner on synthetic pending deliveries.
+
+Usage: python bench_dispatch.py [deliveries] [couriers] [max_stops]
+"""
+import sys
+import os
+import time
+
+import numpy as np
+from bson import ObjectId
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from models import Delivery
+from dispatch import ZONE_DEPOTS, DEFAULT_MAX_STOPS, plan_batches
+
+def make_deliveries(count: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    zones = rng.choice(["dhaka", "chittagong", "other"], size=count, p=[0.6, 0.3, 0.1])
+    deliveries = []
+    for zone in zones:
+        lat, lon = ZONE_DEPOTS[zone]
+        # Scatter stops roughly 15 km around the hub
+        deliveries.append(Delivery(
+            _id=ObjectId(),
+            order_id=str(ObjectId()),
+            status="pending",
+            zone=zone,
+            latitude=lat + rng.normal(0, 0.1),
+            longitude=lon + rng.normal(0, 0.1),
+        ))
+    return deliveries
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    couriers = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    max_stops = int(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_MAX_STOPS
+
+    deliveries = make_deliveries(count)
+    delivery_person_ids = [str(ObjectId()) for _ in range(couriers)]
+
+    start = time.perf_counter()
+    batches = plan_batches(deliveries, delivery_person_ids, max_stops)
+    elapsed = time.perf_counter() - start
+
+    routed = sum(len(batch.delivery_ids) for batch in batches)
+    distance = sum(batch.distance_km for batch in batches)
+    print(f"deliveries: {count}  couriers: {couriers}  max_stops: {max_stops}")
+    print(f"batches: {len(batches)}  routed: {routed}  total distance: {distance:.1f} km")
+    print(f"planning time: {elapsed:.3f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark the service layer on the in-memory storage engine, no database needed.
+
+Usage: python bench_services.py [products] [deliveries]
+"""
+import asyncio
+import sys
+import os
+import time
+
+import numpy as np
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import db
+from storage import MemoryBackend
+from models import Product, ProductAttribute, Order, OrderItem, Delivery, CartItem
+from services import ProductService, OrderService, DeliveryService
+from dispatch import ZONE_DEPOTS, plan_batches
+from pricing import pricing_engine
+
+def report(label: str, elapsed: float, count: int):
+    print(f"{label:<32} {count:>7} ops  {elapsed / count * 1e6:>9.1f} us/op")
+
+async def timed(label: str, count: int, make_call):
+    start = time.perf_counter()
+    for i in range(count):
+        await make_call(i)
+    report(label, time.perf_counter() - start, count)
+
+async def main():
+    product_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    delivery_count = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    rng = np.random.default_rng(7)
+    db.use_backend(MemoryBackend())
+
+    products = []
+    for i in range(product_count):
+        products.append(await ProductService.create_product(Product(
+            title=f"Plant {i}",
+            slug=f"plant-{i}",
+            description="Synthetic benchmark product",
+            price=float(rng.integers(100, 1000)),
+            stock=100,
+            images=[],
+            status="published",
+            attributes=ProductAttribute(usda_zone=f"{rng.integers(1, 13)}a", light="Full Sun", water="Medium"),
+            solution_tags=["Container Gardening"],
+            genus=f"Genus {i % 50}",
+            common_name=f"plant {i}",
+        )))
+    product_ids = [str(product.id) for product in products]
+
+    await timed("get_product_by_id", 20000, lambda i: ProductService.get_product_by_id(product_ids[i % product_count]))
+    await timed("get_product_by_slug", 20000, lambda i: ProductService.get_product_by_slug(f"plant-{i % product_count}"))
+    await timed("get_products (full catalog)", 20, lambda i: ProductService.get_products())
+    await timed("update_product_stock ($inc)", 20000, lambda i: ProductService.update_product_stock(product_ids[i % product_count], 1))
+
+    carts = [
+        [CartItem(product_id=product_ids[j], quantity=1 + j % 3) for j in rng.integers(0, product_count, 5)]
+        for _ in range(200)
+    ]
+    await timed("cart quote (cold)", 200, lambda i: pricing_engine.quote(carts[i], "dhaka"))
+    await timed("cart quote (memoized)", 20000, lambda i: pricing_engine.quote(carts[i % 200], "dhaka"))
+
+    for i in range(delivery_count):
+        zone = str(rng.choice(list(ZONE_DEPOTS)))
+        order = await OrderService.create_order(Order(
+            user_id=f"user-{i % 500}",
+            items=[OrderItem(product_id=product_ids[i % product_count], quantity=1, price=100.0)],
+            total=100.0,
+            shipping_address="Benchmark Road",
+            shipping_location=zone,
+            shipping_cost=0.0,
+            tax=0.0,
+        ))
+        lat, lon = ZONE_DEPOTS[zone]
+        await DeliveryService.create_delivery(Delivery(
+            order_id=str(order.id),
+            status="pending",
+            zone=zone,
+            latitude=lat + rng.normal(0, 0.1),
+            longitude=lon + rng.normal(0, 0.1),
+        ))
+    await timed("get_orders_by_user", 2000, lambda i: OrderService.get_orders_by_user(f"user-{i % 500}"))
+
+    start = time.perf_counter()
+    pending = await DeliveryService.get_pending_deliveries()
+    batches = plan_batches(pending, [f"courier-{i}" for i in range(50)])
+    assigned = await DeliveryService.assign_batches(batches)
+    report(f"dispatch ({assigned} deliveries)", time.perf_counter() - start, 1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
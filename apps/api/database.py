@@ -3,6 +3,13 @@ from pydantic_settings import SettingsConfigDict, BaseSettings
 from typing import Optional
 import os
 
+# Fix relative imports
+try:
+    from .storage import StorageBackend, MotorBackend, MemoryBackend
+except ImportError:
+    # Fallback for direct execution
+    from storage import StorageBackend, MotorBackend, MemoryBackend
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
     
@@ -10,28 +17,47 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "mongo")  # mongo, memory
+    MEMORY_SNAPSHOT_PATH: Optional[str] = os.getenv("MEMORY_SNAPSHOT_PATH")
 
 settings = Settings()
 
 class Database:
-    client: Optional[AsyncIOMotorClient] = None
+    backend: Optional[StorageBackend] = None
+    
+    @classmethod
+    def get_backend(cls) -> StorageBackend:
+        if cls.backend is None:
+            if settings.STORAGE_BACKEND == "memory":
+                cls.backend = MemoryBackend(settings.MEMORY_SNAPSHOT_PATH)
+            elif settings.STORAGE_BACKEND == "mongo":
+                cls.backend = MotorBackend(settings.DATABASE_URL)
+            else:
+                raise ValueError(f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
+        return cls.backend
+    
+    @classmethod
+    def use_backend(cls, backend: StorageBackend):
+        """Swap the storage engine, e.g. an in-memory one for benchmarks."""
+        cls.close_client()
+        cls.backend = backend
     
     @classmethod
     def get_client(cls) -> AsyncIOMotorClient:
-        if cls.client is None:
-            cls.client = AsyncIOMotorClient(settings.DATABASE_URL)
-        return cls.client
+        backend = cls.get_backend()
+        if not isinstance(backend, MotorBackend):
+            raise RuntimeError("The Mongo client is only available with the mongo storage backend")
+        return backend.client
     
     @classmethod
     def get_database(cls):
-        client = cls.get_client()
-        return client.plant_ecommerce
+        return cls.get_backend().get_database()
     
     @classmethod
     def close_client(cls):
-        if cls.client:
-            cls.client.close()
-            cls.client = None
+        if cls.backend:
+            cls.backend.close()
+            cls.backend = None
 
 # Create database instance
-db = Database()
\ No newline at end of file
+db = Database()
@@ -0,0 +1,230 @@
+from typing import Dict, List, Optional, Set, Tuple
+import heapq
+
+import numpy as np
+from bson import ObjectId
+
+# Fix relative imports
+try:
+    from .models import DEFAULT_MAX_STOPS, Delivery, DeliveryBatch
+except ImportError:
+    # Fallback for direct execution
+    from models import DEFAULT_MAX_STOPS, Delivery, DeliveryBatch
+
+EARTH_RADIUS_KM = 6371.0
+MAX_TWO_OPT_PASSES = 200
+
+# Dispatch hub per shipping location (latitude, longitude); routes start here.
+ZONE_DEPOTS: Dict[str, Tuple[float, float]] = {
+    "dhaka": (23.8103, 90.4125),
+    "chittagong": (22.3569, 91.7832),
+    "other": (23.8103, 90.4125),
+}
+
+def normalize_zone(zone: str) -> str:
+    zone = (zone or "").strip().lower()
+    return zone if zone in ZONE_DEPOTS else "other"
+
+def haversine_matrix(coords: np.ndarray) -> np.ndarray:
+    """Pairwise great-circle distances in km for an (n, 2) array of lat/lon degrees."""
+    rad = np.radians(coords)
+    lat = rad[:, 0]
+    lon = rad[:, 1]
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def nearest_neighbour_route(dist: np.ndarray) -> np.ndarray:
+    """Greedy route over every node of `dist`, starting at node 0."""
+    n = dist.shape[0]
+    route = np.empty(n, dtype=np.intp)
+    visited = np.zeros(n, dtype=bool)
+    current = 0
+    for step in range(n):
+        route[step] = current
+        visited[current] = True
+        if step == n - 1:
+            break
+        row = np.where(visited, np.inf, dist[current])
+        current = int(np.argmin(row))
+    return route
+
+def two_opt(route: np.ndarray, dist: np.ndarray, max_passes: int = MAX_TWO_OPT_PASSES) -> np.ndarray:
+    """Best-improvement 2-opt keeping the first and last node of `route` fixed."""
+    route = route.copy()
+    n = len(route)
+    if n < 4:
+        return route
+    # Edge k joins route[k] -> route[k + 1]; only pairs with i < j are valid moves.
+    valid = np.triu(np.ones((n - 1, n - 1), dtype=bool), k=1)
+    for _ in range(max_passes):
+        head = route[:-1]
+        tail = route[1:]
+        edge = dist[head, tail]
+        delta = (
+            dist[np.ix_(head, head)]
+            + dist[np.ix_(tail, tail)]
+            - edge[:, None]
+            - edge[None, :]
+        )
+        delta[~valid] = 0.0
+        best = int(np.argmin(delta))
+        i, j = divmod(best, n - 1)
+        if delta[i, j] >= -1e-9:
+            break
+        route[i + 1:j + 1] = route[i + 1:j + 1][::-1]
+    return route
+
+def path_length(points: np.ndarray) -> float:
+    """Length in km of the open path visiting `points` in order."""
+    if len(points) < 2:
+        return 0.0
+    dist = haversine_matrix(points)
+    return float(dist[np.arange(len(points) - 1), np.arange(1, len(points))].sum())
+
+def solve_route(coords: np.ndarray, depot: Tuple[float, float]) -> Tuple[np.ndarray, float]:
+    """Order stops starting from `depot` as an open path.
+
+    Returns the stop indices in visiting order and the route length in km.
+    """
+    points = np.vstack([np.asarray(depot, dtype=float)[None, :], coords])
+    n = points.shape[0]
+    # A zero-cost sink node lets 2-opt move the last stop freely.
+    dist = np.zeros((n + 1, n + 1))
+    dist[:n, :n] = haversine_matrix(points)
+    route = nearest_neighbour_route(dist[:n, :n])
+    route = two_opt(np.append(route, n), dist)
+    stops = route[1:-1]
+    length = float(dist[route[:-2], route[1:-1]].sum())
+    return stops - 1, length
+
+def allocate_couriers(
+    work: Dict[str, int],
+    delivery_person_ids: List[str],
+    courier_zones: Optional[Dict[str, str]] = None,
+) -> Dict[str, List[str]]:
+    """Give every courier exactly one zone for this run.
+
+    Couriers pinned in `courier_zones` keep their zone. The rest go first to
+    zones that have work but no courier, then to whichever zone has the most
+    stops per courier. Zones left without a courier get no batches.
+    """
+    courier_zones = {person_id: normalize_zone(zone) for person_id, zone in (courier_zones or {}).items()}
+    allocation: Dict[str, List[str]] = {zone: [] for zone in work}
+    free = []
+    for person_id in delivery_person_ids:
+        zone = courier_zones.get(person_id)
+        if zone is None:
+            free.append(person_id)
+        elif zone in allocation:
+            allocation[zone].append(person_id)
+
+    def need(zone: str) -> Tuple[bool, float]:
+        # Uncovered zones first, then the most stops per courier
+        return (not allocation[zone], work[zone] / (len(allocation[zone]) + 1))
+
+    for person_id in free:
+        allocation[max(work, key=need)].append(person_id)
+    return allocation
+
+def plan_batches(
+    deliveries: List[Delivery],
+    delivery_person_ids: List[str],
+    max_stops: int = DEFAULT_MAX_STOPS,
+    courier_zones: Optional[Dict[str, str]] = None,
+) -> List[DeliveryBatch]:
+    """Group pending deliveries into routed batches and assign them to couriers.
+
+    Deliveries are grouped by zone. Those with coordinates are swept by
+    bearing around the zone hub into batches of at most `max_stops` and
+    routed with nearest neighbour plus 2-opt. Those without coordinates
+    cannot be routed, so they are only batched by zone (`routed=False`).
+
+    Couriers are allocated one zone each (see `allocate_couriers`), so nobody
+    is sent to two cities. Within a zone, batches go longest first to the
+    courier with the least driving so far, counting the return to the hub
+    between batches, then fewest stops. Deliveries in a zone with no courier
+    stay pending.
+    """
+    if not deliveries or not delivery_person_ids:
+        return []
+
+    zones = np.array([normalize_zone(d.zone) for d in deliveries])
+    located = np.array([d.latitude is not None and d.longitude is not None for d in deliveries])
+    coords = np.zeros((len(deliveries), 2))
+    for index in np.flatnonzero(located):
+        coords[index] = (deliveries[index].latitude, deliveries[index].longitude)
+
+    # zone -> [(delivery ids, route km or None, km to drive including the return leg)]
+    planned: Dict[str, List[Tuple[List[str], Optional[float], float]]] = {}
+    for zone in np.unique(zones):
+        zone = str(zone)
+        depot = ZONE_DEPOTS[zone]
+        trips = planned.setdefault(zone, [])
+        members = np.flatnonzero((zones == zone) & located)
+        bearing = np.arctan2(coords[members, 0] - depot[0], coords[members, 1] - depot[1])
+        members = members[np.argsort(bearing, kind="stable")]
+        for start in range(0, len(members), max_stops):
+            chunk = members[start:start + max_stops]
+            order, length = solve_route(coords[chunk], depot)
+            last = coords[chunk[order[-1]]]
+            back = float(haversine_matrix(np.vstack([last, depot]))[0, 1])
+            trips.append(([str(deliveries[k].id) for k in chunk[order]], length, length + back))
+
+        unlocated = np.flatnonzero((zones == zone) & ~located)
+        for start in range(0, len(unlocated), max_stops):
+            chunk = unlocated[start:start + max_stops]
+            trips.append(([str(deliveries[k].id) for k in chunk], None, 0.0))
+
+    work = {zone: int(np.sum(zones == zone)) for zone in planned}
+    allocation = allocate_couriers(work, delivery_person_ids, courier_zones)
+    rank = {person_id: index for index, person_id in enumerate(delivery_person_ids)}
+
+    batches = []
+    for zone, trips in planned.items():
+        couriers = allocation.get(zone)
+        if not couriers:
+            continue
+        load = [(0.0, 0, rank[person_id], person_id) for person_id in couriers]
+        heapq.heapify(load)
+        trips.sort(key=lambda trip: trip[2], reverse=True)
+        for delivery_ids, length, driven in trips:
+            assigned_km, assigned_stops, index, person_id = heapq.heappop(load)
+            heapq.heappush(load, (assigned_km + driven, assigned_stops + len(delivery_ids), index, person_id))
+            batches.append(DeliveryBatch(
+                batch_id=str(ObjectId()),
+                zone=zone,
+                delivery_person_id=person_id,
+                delivery_ids=delivery_ids,
+                routed=length is not None,
+                distance_km=None if length is None else round(length, 3),
+            ))
+    return batches
+
+def keep_claimed(
+    batches: List[DeliveryBatch],
+    claimed_ids: Set[str],
+    deliveries: List[Delivery],
+) -> List[DeliveryBatch]:
+    """Trim planned batches to the deliveries the dispatch actually claimed.
+
+    Batches left empty are dropped. Routed batches that lost stops keep
+    their visiting order and get their length re-measured.
+    """
+    by_id = {str(delivery.id): delivery for delivery in deliveries}
+    kept = []
+    for batch in batches:
+        delivery_ids = [delivery_id for delivery_id in batch.delivery_ids if delivery_id in claimed_ids]
+        if not delivery_ids:
+            continue
+        if len(delivery_ids) < len(batch.delivery_ids):
+            batch = batch.copy(update={"delivery_ids": delivery_ids})
+            if batch.routed:
+                points = np.array(
+                    [ZONE_DEPOTS[batch.zone]]
+                    + [(by_id[delivery_id].latitude, by_id[delivery_id].longitude) for delivery_id in delivery_ids]
+                )
+                batch.distance_km = round(path_length(points), 3)
+        kept.append(batch)
+    return kept
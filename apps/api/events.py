@@ -0,0 +1,300 @@
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+import asyncio
+import itertools
+import json
+import logging
+import uuid
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure, PyMongoError
+
+# Fix relative imports
+try:
+    from .database import db
+    from .models import Delivery, Order
+    from .services import OrderService
+except ImportError:
+    # Fallback for direct execution
+    from database import db
+    from models import Delivery, Order
+    from services import OrderService
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_BUFFER = 64
+REPLAY_BUFFER = 2048
+HEARTBEAT_SECONDS = 15.0
+RETRY_MILLISECONDS = 3000
+RECONNECT_SECONDS = 5.0
+ORDER_OWNER_CACHE_SIZE = 10000
+WATCHED_COLLECTIONS = ["orders", "deliveries"]
+
+# Event id, topics it was sent to, SSE-formatted message
+Event = Tuple[str, Tuple[str, ...], str]
+
+def order_topic(order_id: str) -> str:
+    return f"order:{order_id}"
+
+def user_topic(user_id: str) -> str:
+    return f"user:{user_id}"
+
+class Subscriber:
+    def __init__(self, topic: str):
+        self.topic = topic
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=SUBSCRIBER_BUFFER)
+        self.dropped = 0
+
+    def offer(self, message: str) -> bool:
+        """Queue a message, dropping the oldest one if the client is behind."""
+        dropped = False
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            dropped = True
+        self.queue.put_nowait(message)
+        return dropped
+
+class EventBroker:
+    """Fans order and delivery status changes out to SSE subscribers.
+
+    One Mongo change stream per worker feeds every subscriber. While the
+    stream is unavailable (e.g. a standalone server without a replica set),
+    the API publishes its own status changes in-process instead.
+    """
+
+    def __init__(self):
+        self.topics: Dict[str, Set[Subscriber]] = {}
+        self.replay: Deque[Event] = deque(maxlen=REPLAY_BUFFER)
+        self.order_owners: "OrderedDict[str, str]" = OrderedDict()
+        self.mode = "local"
+        self.resume_token: Optional[Dict[str, Any]] = None
+        self.task: Optional[asyncio.Task] = None
+        # Local ids are unique per process so a stale Last-Event-ID never matches
+        self.instance = uuid.uuid4().hex[:8]
+        self.sequence = itertools.count(1)
+        self.user_subscribers = 0
+        self.connections = 0
+        self.peak_connections = 0
+        self.total_connections = 0
+        self.events_published = 0
+        self.messages_sent = 0
+        self.messages_dropped = 0
+
+    # Lifecycle
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self._watch())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        self.mode = "local"
+
+    async def _watch(self):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": WATCHED_COLLECTIONS},
+            "operationType": {"$in": ["insert", "update", "replace"]},
+        }}]
+        while True:
+            try:
+                async with db.get_database().watch(
+                    pipeline,
+                    full_document="updateLookup",
+                    resume_after=self.resume_token
+                ) as stream:
+                    self.mode = "change_stream"
+                    logger.info("Status events fed by Mongo change stream")
+                    async for change in stream:
+                        self.resume_token = stream.resume_token
+                        await self._handle_change(change)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                self.mode = "local"
+                if self.resume_token is not None:
+                    # The token may have aged out of the oplog; start fresh
+                    self.resume_token = None
+                    continue
+                logger.warning(f"Change streams unavailable, using in-process events: {e}")
+                return
+            except PyMongoError as e:
+                if self.resume_token is None:
+                    # Nothing to resume from; publish in-process until the stream is back
+                    self.mode = "local"
+                # With a token, the resumed stream replays the changes made meanwhile,
+                # so publishing them locally as well would send duplicates
+                logger.warning(f"Change stream interrupted, retrying: {e}")
+                await asyncio.sleep(RECONNECT_SECONDS)
+
+    async def _handle_change(self, change: Dict[str, Any]):
+        if change["operationType"] == "update":
+            if "status" not in change.get("updateDescription", {}).get("updatedFields", {}):
+                return
+        document = change.get("fullDocument")
+        if not document:
+            return
+        resource = "order" if change["ns"]["coll"] == "orders" else "delivery"
+        await self._publish(resource, document, event_id=change["_id"]["_data"])
+
+    # Publishing
+
+    async def publish_order(self, order: Order):
+        """In-process notification; a no-op while the change stream is live."""
+        if self.mode == "local":
+            await self._publish("order", order.dict(by_alias=True))
+
+    async def publish_deliveries(self, deliveries: List[Delivery]):
+        """In-process notification; a no-op while the change stream is live."""
+        if self.mode != "local":
+            return
+        documents = [delivery.dict(by_alias=True) for delivery in deliveries]
+        if self.user_subscribers:
+            # Deliveries created before user_id was stored: find their owners in one query
+            owners = await self._order_owners([document["order_id"] for document in documents if not document["user_id"]])
+            for document in documents:
+                document["user_id"] = document["user_id"] or owners.get(document["order_id"])
+        for document in documents:
+            await self._publish("delivery", document)
+
+    async def _order_owners(self, order_ids: List[str]) -> Dict[str, str]:
+        owners = {order_id: self.order_owners[order_id] for order_id in order_ids if order_id in self.order_owners}
+        unknown = list({order_id for order_id in order_ids if order_id not in owners and ObjectId.is_valid(order_id)})
+        if unknown:
+            for order in await OrderService.get_orders_by_ids(unknown):
+                owners[str(order.id)] = order.user_id
+                self._remember_owner(str(order.id), order.user_id)
+        return owners
+
+    async def _order_owner(self, order_id: str) -> Optional[str]:
+        user_id = self.order_owners.get(order_id)
+        if user_id is None and order_id and ObjectId.is_valid(order_id):
+            order = await OrderService.get_order_by_id(order_id)
+            if order is None:
+                return None
+            user_id = order.user_id
+            self._remember_owner(order_id, user_id)
+        return user_id
+
+    def _remember_owner(self, order_id: str, user_id: str):
+        self.order_owners[order_id] = user_id
+        self.order_owners.move_to_end(order_id)
+        if len(self.order_owners) > ORDER_OWNER_CACHE_SIZE:
+            self.order_owners.popitem(last=False)
+
+    async def _publish(self, resource: str, document: Dict[str, Any], event_id: Optional[str] = None):
+        if resource == "order":
+            order_id = str(document.get("_id"))
+            user_id = document.get("user_id")
+            self._remember_owner(order_id, user_id)
+        else:
+            order_id = document.get("order_id")
+            user_id = document.get("user_id")
+            if "user_id" not in document and self.user_subscribers:
+                # Change events for deliveries stored before user_id existed;
+                # only pay for the lookup when someone follows a user stream
+                user_id = await self._order_owner(order_id)
+
+        updated_at = document.get("updated_at") or document.get("created_at")
+        payload = {
+            "resource": resource,
+            "id": str(document.get("_id")),
+            "order_id": order_id,
+            "user_id": user_id,
+            "status": document.get("status"),
+            "updated_at": updated_at.isoformat() if isinstance(updated_at, datetime) else updated_at,
+        }
+        if event_id is None:
+            event_id = f"local-{self.instance}-{next(self.sequence)}"
+        message = f"id: {event_id}\nevent: status\ndata: {json.dumps(payload)}\n\n"
+        topics = (order_topic(order_id),) + ((user_topic(user_id),) if user_id else ())
+
+        self.replay.append((event_id, topics, message))
+        self.events_published += 1
+        for topic in topics:
+            for subscriber in self.topics.get(topic, ()):
+                if subscriber.offer(message):
+                    self.messages_dropped += 1
+                self.messages_sent += 1
+
+    # Subscriptions
+
+    def subscribe(self, topic: str, last_event_id: Optional[str] = None) -> Subscriber:
+        subscriber = Subscriber(topic)
+        if last_event_id:
+            missed = self.missed_since(topic, last_event_id)
+            if missed is None:
+                # Too old to replay; the client should refetch current state
+                subscriber.offer("event: resync\ndata: {}\n\n")
+            for message in missed or []:
+                subscriber.offer(message)
+        self.topics.setdefault(topic, set()).add(subscriber)
+        if topic.startswith("user:"):
+            self.user_subscribers += 1
+        self.connections += 1
+        self.total_connections += 1
+        self.peak_connections = max(self.peak_connections, self.connections)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self.topics.get(subscriber.topic)
+        if not subscribers or subscriber not in subscribers:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self.topics[subscriber.topic]
+        if subscriber.topic.startswith("user:"):
+            self.user_subscribers -= 1
+        self.connections -= 1
+
+    def missed_since(self, topic: str, last_event_id: str) -> Optional[List[str]]:
+        """Messages for `topic` after `last_event_id`, or None if it is no longer buffered."""
+        missed: List[str] = []
+        found = False
+        for event_id, topics, message in self.replay:
+            if found and topic in topics:
+                missed.append(message)
+            elif event_id == last_event_id:
+                found = True
+        return missed if found else None
+
+    async def stream(self, topic: str, is_disconnected, last_event_id: Optional[str] = None):
+        """SSE body for one subscriber, with periodic heartbeat comments.
+
+        The subscription is made when the body starts streaming, so a client
+        that goes away before the first chunk never leaves one behind.
+        """
+        subscriber = self.subscribe(topic, last_event_id)
+        try:
+            yield f"retry: {RETRY_MILLISECONDS}\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscriber.queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        break
+                    yield ": heartbeat\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "connections": self.connections,
+            "peak_connections": self.peak_connections,
+            "total_connections": self.total_connections,
+            "topics": len(self.topics),
+            "events_published": self.events_published,
+            "messages_sent": self.messages_sent,
+            "messages_dropped": self.messages_dropped,
+        }
+
+# Create event broker instance
+event_broker = EventBroker()
@@ -1,5 +1,6 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
@@ -7,14 +8,22 @@ import os
 
 # Import our models and services
 try:
-    from .models import User, Product, Order, OrderItem, Delivery, FinanceRecord, ProductionRecord, AuditLog
-    from .services import UserService, ProductService, OrderService, DeliveryService, FinanceService, ProductionService, AuditService
+    from .models import User, Product, Order, OrderItem, CartQuoteRequest, CartItem, ShippingRule, TaxRule, Delivery, DispatchRequest, FinanceRecord, ProductionRecord, AuditLog
+    from .services import UserService, ProductService, RecommendationService, PricingService, OrderService, DeliveryService, FinanceService, ProductionService, AuditService
     from .database import db
+    from .dispatch import plan_batches, keep_claimed
+    from .recommendations import rebuild_related_products, refresh_related_products
+    from .pricing import pricing_engine
+    from .events import event_broker, order_topic, user_topic
 except ImportError:
     # Fallback for direct execution
-    from models import User, Product, Order, OrderItem, Delivery, FinanceRecord, ProductionRecord, AuditLog
-    from services import UserService, ProductService, OrderService, DeliveryService, FinanceService, ProductionService, AuditService
+    from models import User, Product, Order, OrderItem, CartQuoteRequest, CartItem, ShippingRule, TaxRule, Delivery, DispatchRequest, FinanceRecord, ProductionRecord, AuditLog
+    from services import UserService, ProductService, RecommendationService, PricingService, OrderService, DeliveryService, FinanceService, ProductionService, AuditService
     from database import db
+    from dispatch import plan_batches, keep_claimed
+    from recommendations import rebuild_related_products, refresh_related_products
+    from pricing import pricing_engine
+    from events import event_broker, order_topic, user_topic
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -35,10 +44,12 @@ app.add_middleware(
 # Startup and shutdown events
 @app.on_event("startup")
 async def startup_db_client():
-    pass  # Database connection is handled in the database module
+    # Database connection is handled in the database module
+    event_broker.start()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await event_broker.stop()
     db.close_client()
 
 # Authentication dependency (simplified for this example)
@@ -107,10 +118,25 @@ async def get_product(product_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/products/{product_id}/related")
+async def get_related_products(product_id: str):
+    try:
+        related = await RecommendationService.get_related_products(product_id)
+        return related.related if related else []
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/products/related/rebuild", dependencies=[Depends(RoleChecker(["Admin"]))])
+async def rebuild_related(background_tasks: BackgroundTasks):
+    background_tasks.add_task(rebuild_related_products)
+    return {"message": "Related products rebuild scheduled"}
+
 @app.post("/products", dependencies=[Depends(RoleChecker(["Admin", "Moderator"]))])
-async def create_product(product: Product):
+async def create_product(product: Product, background_tasks: BackgroundTasks):
     try:
         new_product = await ProductService.create_product(product)
+        # Fold the new product into the precomputed recommendations
+        background_tasks.add_task(refresh_related_products, [str(new_product.id)])
         # Log the audit event
         audit_log = AuditLog(
             action="product_created",
@@ -124,6 +150,34 @@ async def create_product(product: Product):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Cart routes
+@app.post("/cart/quote")
+async def quote_cart(request: CartQuoteRequest):
+    try:
+        return await pricing_engine.quote(request.items, request.shipping_location)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.put("/pricing/shipping", dependencies=[Depends(RoleChecker(["Admin", "Finance"]))])
+async def set_shipping_rule(rule: ShippingRule):
+    try:
+        saved = await PricingService.upsert_shipping_rule(rule)
+        pricing_engine.invalidate()
+        return saved
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.put("/pricing/tax", dependencies=[Depends(RoleChecker(["Admin", "Finance"]))])
+async def set_tax_rule(rule: TaxRule):
+    try:
+        saved = await PricingService.upsert_tax_rule(rule)
+        pricing_engine.invalidate()
+        return saved
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Order routes
 @app.get("/orders", dependencies=[Depends(RoleChecker(["Admin", "Finance"]))])
 async def get_orders():
@@ -141,8 +195,22 @@ async def get_user_orders(user_id: str):
 @app.post("/orders")
 async def create_order(order: Order):
     try:
+        # Price the order server-side instead of trusting client totals
+        quote = await pricing_engine.quote(
+            [CartItem(product_id=item.product_id, quantity=item.quantity) for item in order.items],
+            order.shipping_location
+        )
+        order.items = [
+            OrderItem(product_id=line.product_id, quantity=line.quantity, price=line.unit_price)
+            for line in quote.items
+        ]
+        order.shipping_cost = quote.shipping_cost
+        order.tax = quote.tax
+        order.total = quote.total
+
         # Create the order
         new_order = await OrderService.create_order(order)
+        await event_broker.publish_order(new_order)
         
         # Update product stock
         for item in order.items:
@@ -151,9 +219,14 @@ async def create_order(order: Order):
         # Create delivery record
         delivery = Delivery(
             order_id=str(new_order.id),
-            status="pending"
+            user_id=new_order.user_id,
+            status="pending",
+            zone=order.shipping_location,
+            latitude=order.shipping_latitude,
+            longitude=order.shipping_longitude
         )
         await DeliveryService.create_delivery(delivery)
+        await event_broker.publish_deliveries([delivery])
         
         # Create finance record
         finance = FinanceRecord(
@@ -176,6 +249,8 @@ async def create_order(order: Order):
         await AuditService.log_audit_event(audit_log)
         
         return new_order
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -185,6 +260,65 @@ async def get_deliveries():
     # In a real implementation, this would fetch deliveries from MongoDB
     return {"message": "List of deliveries"}
 
+@app.post("/deliveries/dispatch", dependencies=[Depends(RoleChecker(["Admin", "Delivery"]))])
+async def dispatch_deliveries(request: DispatchRequest):
+    try:
+        delivery_person_ids = request.delivery_person_ids
+        if not delivery_person_ids:
+            couriers = await UserService.get_users_by_role("Delivery")
+            delivery_person_ids = [str(courier.id) for courier in couriers]
+        if not delivery_person_ids:
+            raise HTTPException(status_code=400, detail="No delivery personnel available")
+
+        deliveries = await DeliveryService.get_pending_deliveries()
+
+        # Older deliveries may lack a zone or coordinates; take them from the orders in one query
+        missing = [d.order_id for d in deliveries if not d.zone or d.latitude is None or d.longitude is None]
+        if missing:
+            orders = {str(o.id): o for o in await OrderService.get_orders_by_ids(missing)}
+            for delivery in deliveries:
+                order = orders.get(delivery.order_id)
+                if order is None:
+                    continue
+                delivery.zone = delivery.zone or order.shipping_location
+                if delivery.latitude is None or delivery.longitude is None:
+                    delivery.latitude = order.shipping_latitude
+                    delivery.longitude = order.shipping_longitude
+
+        batches = plan_batches(deliveries, delivery_person_ids, request.max_stops, request.courier_zones)
+        assigned = await DeliveryService.assign_batches(batches)
+
+        # A concurrent dispatch may have claimed some planned deliveries first; assign_batches
+        # skipped those, so re-read to report and announce only what this run wrote.
+        planned = {delivery_id: batch.batch_id for batch in batches for delivery_id in batch.delivery_ids}
+        claimed: List[Delivery] = []
+        if assigned and (assigned < len(planned) or event_broker.mode == "local"):
+            claimed = [
+                delivery for delivery in await DeliveryService.get_deliveries_by_ids(list(planned))
+                if delivery.batch_id == planned[str(delivery.id)]
+            ]
+        if assigned < len(planned):
+            batches = keep_claimed(batches, {str(delivery.id) for delivery in claimed}, deliveries)
+
+        # Without a change stream, announce the new statuses ourselves
+        if event_broker.mode == "local":
+            await event_broker.publish_deliveries(claimed)
+
+        # Log the audit event
+        audit_log = AuditLog(
+            action="deliveries_dispatched",
+            user_id="system",  # In a real app, this would be the actual user ID
+            resource_type="delivery",
+            details={"batches": len(batches), "assigned": assigned}
+        )
+        await AuditService.log_audit_event(audit_log)
+
+        return batches
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/deliveries/order/{order_id}")
 async def get_order_deliveries(order_id: str):
     try:
@@ -193,6 +327,29 @@ async def get_order_deliveries(order_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Event routes
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.get("/events/orders/{order_id}")
+async def stream_order_events(order_id: str, request: Request):
+    return StreamingResponse(
+        event_broker.stream(order_topic(order_id), request.is_disconnected, request.headers.get("last-event-id")),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@app.get("/events/users/{user_id}")
+async def stream_user_events(user_id: str, request: Request):
+    return StreamingResponse(
+        event_broker.stream(user_topic(user_id), request.is_disconnected, request.headers.get("last-event-id")),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@app.get("/events/metrics", dependencies=[Depends(RoleChecker(["Admin"]))])
+async def get_event_metrics():
+    return event_broker.metrics()
+
 # Finance routes
 @app.get("/finance", dependencies=[Depends(RoleChecker(["Admin", "Finance"]))])
 async def get_finance_data():
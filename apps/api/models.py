@@ -1,7 +1,7 @@
 from pydantic import BaseModel, Field, GetJsonSchemaHandler
 from pydantic.json_schema import JsonSchemaValue
 from pydantic_core import core_schema
-from typing import List, Optional, Any
+from typing import Dict, List, Optional, Any
 from datetime import datetime
 # Use bson from pymongo instead of standalone bson package
 from bson import ObjectId
@@ -19,7 +19,7 @@ class PyObjectId(ObjectId):
                     core_schema.str_schema(),
                 ]
             ),
-            serialization=core_schema.str_schema(),
+            serialization=core_schema.to_string_ser_schema(),
         )
 
     @classmethod
@@ -69,21 +69,42 @@ class Product(BaseModel):
         arbitrary_types_allowed = True
         json_encoders = {ObjectId: str}
 
+class RelatedProduct(BaseModel):
+    product_id: str
+    title: str
+    slug: str
+    price: float
+    image: Optional[str] = None
+    score: float
+
+class RelatedProducts(BaseModel):
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    product_id: str
+    related: List[RelatedProduct]
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Config:
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
 class OrderItem(BaseModel):
     product_id: str
     quantity: int
-    price: float
+    price: float = 0.0  # unit price, set server-side when the order is placed
 
 class Order(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     user_id: str
     items: List[OrderItem]
-    total: float
+    # total, shipping_cost and tax are priced server-side in create_order
+    total: float = 0.0
     status: str = "pending"
     shipping_address: str
     shipping_location: str
-    shipping_cost: float
-    tax: float
+    shipping_latitude: Optional[float] = None  # drop-off point, used for route planning
+    shipping_longitude: Optional[float] = None
+    shipping_cost: float = 0.0
+    tax: float = 0.0
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: Optional[datetime] = None
 
@@ -91,14 +112,66 @@ class Order(BaseModel):
         arbitrary_types_allowed = True
         json_encoders = {ObjectId: str}
 
+class CartItem(BaseModel):
+    product_id: str
+    quantity: int = Field(gt=0)
+
+class CartQuoteRequest(BaseModel):
+    items: List[CartItem] = Field(min_length=1)
+    shipping_location: str
+
+class QuoteLine(BaseModel):
+    product_id: str
+    title: str
+    unit_price: float
+    quantity: int
+    line_total: float
+
+class CartQuote(BaseModel):
+    items: List[QuoteLine]
+    shipping_location: str
+    subtotal: float
+    shipping_cost: float
+    tax: float
+    total: float
+    currency: str = "BDT"
+
+class ShippingRule(BaseModel):
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    location: str  # dhaka, chittagong, other
+    base_cost: float
+    per_item_cost: float = 0.0
+    free_over: Optional[float] = None  # subtotal at which shipping is free
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Config:
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
+class TaxRule(BaseModel):
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    location: str
+    rate: float  # fraction of the subtotal, e.g. 0.05
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Config:
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
 class Delivery(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     order_id: str
+    user_id: Optional[str] = None  # owner of the order, for status streams
     status: str
     tracking_number: Optional[str] = None
     estimated_delivery: Optional[datetime] = None
     actual_delivery: Optional[datetime] = None
     delivery_person_id: Optional[str] = None
+    zone: Optional[str] = None  # dhaka, chittagong, other
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    batch_id: Optional[str] = None
+    route_sequence: Optional[int] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: Optional[datetime] = None
 
@@ -106,6 +179,22 @@ class Delivery(BaseModel):
         arbitrary_types_allowed = True
         json_encoders = {ObjectId: str}
 
+class DeliveryBatch(BaseModel):
+    batch_id: str
+    zone: str
+    delivery_person_id: str
+    delivery_ids: List[str]  # in route order when routed
+    routed: bool = True  # False when the stops had no coordinates to route on
+    distance_km: Optional[float] = None
+
+# Largest batch one courier is handed per dispatch; dispatch.plan_batches uses it too
+DEFAULT_MAX_STOPS = 25
+
+class DispatchRequest(BaseModel):
+    delivery_person_ids: Optional[List[str]] = None
+    courier_zones: Optional[Dict[str, str]] = None  # delivery_person_id -> zone
+    max_stops: int = Field(default=DEFAULT_MAX_STOPS, ge=1)
+
 class FinanceRecord(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     order_id: str
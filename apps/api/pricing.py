@@ -0,0 +1,159 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import time
+
+from bson import ObjectId
+
+# Fix relative imports
+try:
+    from .models import CartItem, CartQuote, QuoteLine, ShippingRule, TaxRule
+    from .services import ProductService, PricingService
+except ImportError:
+    # Fallback for direct execution
+    from models import CartItem, CartQuote, QuoteLine, ShippingRule, TaxRule
+    from services import ProductService, PricingService
+
+# Used for locations without a stored rule; mirrors SHIPPING_LOCATIONS in
+# packages/config and the tax rate the cart page has been showing.
+DEFAULT_SHIPPING_RULES = [
+    ShippingRule(location="dhaka", base_cost=80.0),
+    ShippingRule(location="chittagong", base_cost=120.0),
+    ShippingRule(location="other", base_cost=150.0),
+]
+DEFAULT_TAX_RULE = TaxRule(location="other", rate=0.05)
+FALLBACK_LOCATION = "other"
+
+RULES_CHECK_INTERVAL_SECONDS = 30.0
+QUOTE_TTL_SECONDS = 10.0
+QUOTE_CACHE_SIZE = 4096
+
+# (location, ((product_id, quantity), ...)) with items merged and sorted
+QuoteKey = Tuple[str, Tuple[Tuple[str, int], ...]]
+
+def _location_key(location: str) -> str:
+    return (location or "").strip().lower()
+
+class PricingTables:
+    """Shipping and tax rules compiled into plain dict lookups."""
+
+    def __init__(self, shipping_rules: List[ShippingRule], tax_rules: List[TaxRule]):
+        self.shipping: Dict[str, Tuple[float, float, Optional[float]]] = {
+            _location_key(rule.location): (rule.base_cost, rule.per_item_cost, rule.free_over)
+            for rule in shipping_rules
+        }
+        self.tax: Dict[str, float] = {_location_key(rule.location): rule.rate for rule in tax_rules}
+        for rule in DEFAULT_SHIPPING_RULES:
+            self.shipping.setdefault(rule.location, (rule.base_cost, rule.per_item_cost, rule.free_over))
+        self.tax.setdefault(FALLBACK_LOCATION, DEFAULT_TAX_RULE.rate)
+
+    def shipping_cost(self, location: str, subtotal: float, quantity: int) -> float:
+        base_cost, per_item_cost, free_over = self.shipping.get(location) or self.shipping[FALLBACK_LOCATION]
+        if free_over is not None and subtotal >= free_over:
+            return 0.0
+        return base_cost + per_item_cost * quantity
+
+    def tax_rate(self, location: str) -> float:
+        rate = self.tax.get(location)
+        return self.tax[FALLBACK_LOCATION] if rate is None else rate
+
+class PricingEngine:
+    def __init__(self):
+        self.tables: Optional[PricingTables] = None
+        self.version: Optional[tuple] = None
+        self.checked_at = 0.0
+        self.stale = True
+        self.quotes: "OrderedDict[QuoteKey, Tuple[float, CartQuote]]" = OrderedDict()
+        # Created lazily so it binds to the server's event loop on Python 3.9
+        self.lock: Optional[asyncio.Lock] = None
+
+    def invalidate(self):
+        """Force a table reload on the next quote, e.g. after a rule was edited."""
+        self.stale = True
+        self.version = None
+
+    def _fresh(self) -> bool:
+        return not self.stale and time.monotonic() - self.checked_at < RULES_CHECK_INTERVAL_SECONDS
+
+    async def get_tables(self) -> PricingTables:
+        if self._fresh():
+            return self.tables
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            if self._fresh():
+                return self.tables
+            # Cleared before reading so an invalidate() during the reload still counts
+            self.stale = False
+            try:
+                version = await PricingService.get_rules_version()
+                if self.tables is None or version != self.version:
+                    self.tables = PricingTables(
+                        await PricingService.get_shipping_rules(),
+                        await PricingService.get_tax_rules(),
+                    )
+                    self.version = version
+                    self.quotes.clear()
+            except Exception:
+                self.stale = True
+                raise
+            self.checked_at = time.monotonic()
+        return self.tables
+
+    async def quote(self, items: List[CartItem], shipping_location: str) -> CartQuote:
+        """Price a cart server-side. Raises ValueError for empty carts and unknown products."""
+        if not items:
+            raise ValueError("Cart is empty")
+        tables = await self.get_tables()
+        location = _location_key(shipping_location)
+
+        quantities: Dict[str, int] = {}
+        for item in items:
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+        key: QuoteKey = (location, tuple(sorted(quantities.items())))
+
+        now = time.monotonic()
+        cached = self.quotes.get(key)
+        if cached is not None and cached[0] > now:
+            self.quotes.move_to_end(key)
+            return cached[1].copy(deep=True)
+
+        valid_ids = [product_id for product_id in quantities if ObjectId.is_valid(product_id)]
+        products = {str(product.id): product for product in await ProductService.get_products_by_ids(valid_ids)}
+        missing = [product_id for product_id in quantities if product_id not in products]
+        if missing:
+            raise ValueError(f"Unknown products: {', '.join(missing)}")
+
+        lines = []
+        subtotal = 0.0
+        for product_id, quantity in quantities.items():
+            product = products[product_id]
+            line_total = round(product.price * quantity, 2)
+            subtotal += line_total
+            lines.append(QuoteLine(
+                product_id=product_id,
+                title=product.title,
+                unit_price=product.price,
+                quantity=quantity,
+                line_total=line_total,
+            ))
+        subtotal = round(subtotal, 2)
+        shipping_cost = round(tables.shipping_cost(location, subtotal, sum(quantities.values())), 2)
+        tax = round(subtotal * tables.tax_rate(location), 2)
+        result = CartQuote(
+            items=lines,
+            shipping_location=location,
+            subtotal=subtotal,
+            shipping_cost=shipping_cost,
+            tax=tax,
+            total=round(subtotal + shipping_cost + tax, 2),
+        )
+
+        self.quotes[key] = (now + QUOTE_TTL_SECONDS, result)
+        self.quotes.move_to_end(key)
+        if len(self.quotes) > QUOTE_CACHE_SIZE:
+            self.quotes.popitem(last=False)
+        return result.copy(deep=True)
+
+# Create pricing engine instance
+pricing_engine = PricingEngine()
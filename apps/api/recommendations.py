@@ -0,0 +1,293 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import re
+
+import numpy as np
+
+# Fix relative imports
+try:
+    from .models import Product, RelatedProduct, RelatedProducts
+    from .services import ProductService, OrderService, RecommendationService
+except ImportError:
+    # Fallback for direct execution
+    from models import Product, RelatedProduct, RelatedProducts
+    from services import ProductService, OrderService, RecommendationService
+
+DEFAULT_TOP_K = 8
+BLOCK_SIZE = 1024
+CO_PURCHASE_WEIGHT = 0.5
+
+# Relative weight of each feature group before rows are L2-normalized
+TAG_WEIGHT = 1.0
+GENUS_WEIGHT = 1.5
+LIGHT_WEIGHT = 0.75
+WATER_WEIGHT = 0.75
+ZONE_WEIGHT = 0.75
+MAX_USDA_ZONE = 13
+
+def _zone_number(zone: str) -> Optional[int]:
+    match = re.match(r"\s*(\d+)", zone or "")
+    if not match:
+        return None
+    return min(int(match.group(1)), MAX_USDA_ZONE)
+
+class SparseRows:
+    """Row-major sparse matrix (CSR).
+
+    Row `r` holds its non-zero columns in `cols[indptr[r]:indptr[r + 1]]`
+    and the matching entries in `values`. Scoring densifies one block of
+    rows at a time, so memory follows the block size, not the catalog.
+    """
+
+    def __init__(self, n_cols: int, indptr: np.ndarray, cols: np.ndarray, values: np.ndarray):
+        self.n_rows = len(indptr) - 1
+        self.n_cols = n_cols
+        self.indptr = indptr
+        self.cols = cols
+        self.values = values
+
+    def dense_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Entries of `rows` as a dense (len(rows), n_cols) block."""
+        block = np.zeros((len(rows), self.n_cols), dtype=np.float32)
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        if lengths.sum() == 0:
+            return block
+        # Positions of every stored entry of the selected rows, row by row
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        block[np.repeat(np.arange(len(rows)), lengths), self.cols[offsets]] = self.values[offsets]
+        return block
+
+def _sparse_from_rows(n_rows: int, n_cols: int, rows: np.ndarray, cols: np.ndarray, values: np.ndarray) -> SparseRows:
+    """CSR from entries already sorted by row."""
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return SparseRows(n_cols, indptr, cols.astype(np.intp), values.astype(np.float32))
+
+def encode_products(products: List[Product]) -> SparseRows:
+    """Encode products as sparse L2-normalized feature rows.
+
+    Tags, genus, light and water are one-hot; the USDA zone also lights up
+    its neighbouring zones at half weight so nearby zones count as similar.
+    Zone columns come first, then one column per distinct categorical value.
+    """
+    zone_columns = MAX_USDA_ZONE + 2
+    vocab: Dict[Tuple[str, str], int] = {}
+    rows: List[int] = []
+    cols: List[int] = []
+    values: List[float] = []
+
+    def add(row: int, group: str, value: str, weight: float):
+        value = (value or "").strip().lower()
+        if not value:
+            return
+        rows.append(row)
+        cols.append(zone_columns + vocab.setdefault((group, value), len(vocab)))
+        values.append(weight)
+
+    for row, product in enumerate(products):
+        zone = _zone_number(product.attributes.usda_zone)
+        if zone is not None:
+            for col, weight in ((zone - 1, ZONE_WEIGHT / 2), (zone, ZONE_WEIGHT), (zone + 1, ZONE_WEIGHT / 2)):
+                if col >= 0:
+                    rows.append(row)
+                    cols.append(col)
+                    values.append(weight)
+        for tag in set(product.solution_tags):
+            add(row, "tag", tag, TAG_WEIGHT)
+        add(row, "genus", product.genus, GENUS_WEIGHT)
+        add(row, "light", product.attributes.light, LIGHT_WEIGHT)
+        add(row, "water", product.attributes.water, WATER_WEIGHT)
+
+    row_ids = np.array(rows, dtype=np.intp)
+    weights = np.array(values, dtype=np.float32)
+    norms = np.sqrt(np.bincount(row_ids, weights=weights ** 2, minlength=len(products)))
+    weights /= np.where(norms > 0, norms, 1.0)[row_ids]
+    return _sparse_from_rows(len(products), zone_columns + len(vocab), row_ids, np.array(cols), weights)
+
+def similarity(features: SparseRows, rows: np.ndarray) -> np.ndarray:
+    """Cosine similarity of `rows` to every product: (len(rows), n_rows)."""
+    block = features.dense_rows(rows)
+    scores = np.empty((len(rows), features.n_rows), dtype=np.float32)
+    for start in range(0, features.n_rows, BLOCK_SIZE):
+        others = np.arange(start, min(start + BLOCK_SIZE, features.n_rows))
+        scores[:, start:start + len(others)] = block @ features.dense_rows(others).T
+    return scores
+
+def co_purchase_matrix(baskets: Iterable[List[str]], index: Dict[str, int]) -> SparseRows:
+    """Count how often each pair of products was bought in the same order.
+
+    The diagonal is never stored.
+    """
+    n = len(index)
+    pairs: List[np.ndarray] = [np.empty(0, dtype=np.int64)]
+    for basket in baskets:
+        columns = np.unique([index[product_id] for product_id in basket if product_id in index]).astype(np.int64)
+        if len(columns) < 2:
+            continue
+        # Pair (a, b) is keyed a * n + b
+        grid = columns[:, None] * n + columns[None, :]
+        pairs.append(grid[~np.eye(len(columns), dtype=bool)])
+
+    # np.unique sorts the keys, so the pairs come out in row order
+    keys, counts = np.unique(np.concatenate(pairs), return_counts=True)
+    return _sparse_from_rows(n, n, keys // max(n, 1), keys % max(n, 1), counts)
+
+def top_k_related(
+    features: SparseRows,
+    co_purchase: Optional[SparseRows] = None,
+    k: int = DEFAULT_TOP_K,
+    rows: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k neighbours for `rows` (default: every product), best first.
+
+    Scores are cosine similarity plus `CO_PURCHASE_WEIGHT` times the
+    log-scaled co-purchase count, normalized per product.
+    """
+    n = features.n_rows
+    rows = np.arange(n) if rows is None else np.asarray(rows, dtype=np.intp)
+    k = min(k, n - 1)
+    if k <= 0 or len(rows) == 0:
+        return np.empty((len(rows), 0), dtype=np.intp), np.empty((len(rows), 0), dtype=np.float32)
+
+    indices = np.empty((len(rows), k), dtype=np.intp)
+    scores = np.empty((len(rows), k), dtype=np.float32)
+    for start in range(0, len(rows), BLOCK_SIZE):
+        block = rows[start:start + BLOCK_SIZE]
+        block_scores = similarity(features, block)
+        if co_purchase is not None:
+            co = np.log1p(co_purchase.dense_rows(block))
+            peak = co.max(axis=1, keepdims=True)
+            block_scores += CO_PURCHASE_WEIGHT * co / np.where(peak > 0, peak, 1.0)
+        block_scores[np.arange(len(block)), block] = -np.inf
+        top = np.argpartition(-block_scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(block_scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        indices[start:start + len(block)] = np.take_along_axis(top, order, axis=1)
+        scores[start:start + len(block)] = np.take_along_axis(top_scores, order, axis=1)
+    return indices, scores
+
+def _summary(product: Product, score: float) -> RelatedProduct:
+    return RelatedProduct(
+        product_id=str(product.id),
+        title=product.title,
+        slug=product.slug,
+        price=product.price,
+        image=product.images[0] if product.images else None,
+        score=round(float(score), 4),
+    )
+
+def _related(products: List[Product], rows: Iterable[int], indices: np.ndarray, scores: np.ndarray) -> List[RelatedProducts]:
+    return [
+        RelatedProducts(
+            product_id=str(products[row].id),
+            related=[_summary(products[j], score) for j, score in zip(indices[i], scores[i])],
+        )
+        for i, row in enumerate(rows)
+    ]
+
+def plan_rebuild(products: List[Product], baskets: List[List[str]], k: int = DEFAULT_TOP_K) -> List[RelatedProducts]:
+    """Related products for the whole catalog. CPU-bound; run it off the event loop."""
+    index = {str(product.id): row for row, product in enumerate(products)}
+    features = encode_products(products)
+    indices, scores = top_k_related(features, co_purchase_matrix(baskets, index), k)
+    return _related(products, range(len(products)), indices, scores)
+
+def plan_refresh(
+    products: List[Product],
+    product_ids: List[str],
+    stored: List[RelatedProducts],
+    k: int = DEFAULT_TOP_K,
+) -> List[RelatedProducts]:
+    """Neighbour lists that change when `product_ids` join the catalog.
+
+    New products have no order history, so only their content similarity is
+    needed: they get fresh neighbour lists, and `stored` lists are updated
+    where a new product beats their current k-th entry. CPU-bound; run it
+    off the event loop.
+    """
+    index = {str(product.id): row for row, product in enumerate(products)}
+    new_rows = np.array([index[product_id] for product_id in product_ids if product_id in index], dtype=np.intp)
+    if len(new_rows) == 0:
+        return []
+    features = encode_products(products)
+    indices, scores = top_k_related(features, None, k, new_rows)
+    changed = {entry.product_id: entry for entry in _related(products, new_rows, indices, scores)}
+
+    # Similarity of every product to each new product: (len(new_rows), n)
+    incoming = similarity(features, new_rows)
+    is_new = np.zeros(len(products), dtype=bool)
+    is_new[new_rows] = True
+    for entry in stored:
+        row = index.get(entry.product_id)
+        if row is None or is_new[row]:
+            continue
+        floor = entry.related[-1].score if len(entry.related) >= k else -np.inf
+        candidates = [
+            _summary(products[new_row], incoming[i, row])
+            for i, new_row in enumerate(new_rows)
+            if incoming[i, row] > floor
+        ]
+        if candidates:
+            merged = sorted(entry.related + candidates, key=lambda related: related.score, reverse=True)
+            entry.related = merged[:k]
+            changed[entry.product_id] = entry
+    return list(changed.values())
+
+class RelatedProductsUpdater:
+    """Serializes writes to the stored recommendations.
+
+    A refresh reads the stored lists, merges new products in and writes them
+    back, so two overlapping updates would each drop the other's changes.
+    Updates run one at a time instead, and products created while one is
+    running are folded into a single follow-up refresh.
+    """
+
+    def __init__(self):
+        self.pending: Set[str] = set()
+        # Created lazily so it binds to the server's event loop on Python 3.9
+        self.lock: Optional[asyncio.Lock] = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        return self.lock
+
+    async def rebuild(self, k: int = DEFAULT_TOP_K) -> int:
+        async with self._get_lock():
+            # The rebuild reads the catalog after this point, so it covers them
+            self.pending.clear()
+            products = await ProductService.get_products()
+            if not products:
+                return 0
+            baskets = await OrderService.get_order_product_ids()
+            related = await asyncio.to_thread(plan_rebuild, products, baskets, k)
+            return await RecommendationService.save_related_products(related)
+
+    async def refresh(self, product_ids: List[str], k: int = DEFAULT_TOP_K) -> int:
+        self.pending.update(product_ids)
+        async with self._get_lock():
+            if not self.pending:
+                # An earlier refresh or rebuild already picked these up
+                return 0
+            product_ids = list(self.pending)
+            self.pending.clear()
+            products = await ProductService.get_products()
+            stored = await RecommendationService.get_all_related_products()
+            changed = await asyncio.to_thread(plan_refresh, products, product_ids, stored, k)
+            return await RecommendationService.save_related_products(changed)
+
+# Create related products updater instance
+related_products_updater = RelatedProductsUpdater()
+
+async def rebuild_related_products(k: int = DEFAULT_TOP_K) -> int:
+    """Recompute related products for the whole catalog and store them."""
+    return await related_products_updater.rebuild(k)
+
+async def refresh_related_products(product_ids: List[str], k: int = DEFAULT_TOP_K) -> int:
+    """Fold newly created products into the stored recommendations."""
+    return await related_products_updater.refresh(product_ids, k)
+
+if __name__ == "__main__":
+    updated = asyncio.run(rebuild_related_products())
+    print(f"Related products updated for {updated} products")
@@ -1,15 +1,16 @@
 from typing import List, Optional
 from bson import ObjectId
 from datetime import datetime
+from pymongo import ReplaceOne, UpdateOne
 
 # Fix relative imports
 try:
     from .database import db
-    from .models import User, Product, Order, Delivery, FinanceRecord, ProductionRecord, AuditLog
+    from .models import User, Product, RelatedProducts, ShippingRule, TaxRule, Order, Delivery, DeliveryBatch, FinanceRecord, ProductionRecord, AuditLog
 except ImportError:
     # Fallback for direct execution
     from database import db
-    from models import User, Product, Order, Delivery, FinanceRecord, ProductionRecord, AuditLog
+    from models import User, Product, RelatedProducts, ShippingRule, TaxRule, Order, Delivery, DeliveryBatch, FinanceRecord, ProductionRecord, AuditLog
 
 class UserService:
     @staticmethod
@@ -31,11 +32,20 @@ class UserService:
     @staticmethod
     async def create_user(user: User) -> User:
         collection = db.get_database().users
-        user_dict = user.dict(by_alias=True)
+        user_dict = user.dict(by_alias=True, exclude={"id"})
         result = await collection.insert_one(user_dict)
         user.id = result.inserted_id
         return user
 
+    @staticmethod
+    async def get_users_by_role(role: str) -> List[User]:
+        collection = db.get_database().users
+        cursor = collection.find({"role": role})
+        users = []
+        async for user_data in cursor:
+            users.append(User(**user_data))
+        return users
+
     @staticmethod
     async def update_user_role(user_id: str, role: str) -> bool:
         collection = db.get_database().users
@@ -63,6 +73,15 @@ class ProductService:
             return Product(**product_data)
         return None
 
+    @staticmethod
+    async def get_products_by_ids(product_ids: List[str]) -> List[Product]:
+        collection = db.get_database().products
+        cursor = collection.find({"_id": {"$in": [ObjectId(product_id) for product_id in product_ids]}})
+        products = []
+        async for product_data in cursor:
+            products.append(Product(**product_data))
+        return products
+
     @staticmethod
     async def get_product_by_slug(slug: str) -> Optional[Product]:
         collection = db.get_database().products
@@ -74,7 +93,7 @@ class ProductService:
     @staticmethod
     async def create_product(product: Product) -> Product:
         collection = db.get_database().products
-        product_dict = product.dict(by_alias=True)
+        product_dict = product.dict(by_alias=True, exclude={"id"})
         result = await collection.insert_one(product_dict)
         product.id = result.inserted_id
         return product
@@ -88,6 +107,87 @@ class ProductService:
         )
         return result.modified_count > 0
 
+class RecommendationService:
+    @staticmethod
+    async def get_related_products(product_id: str) -> Optional[RelatedProducts]:
+        collection = db.get_database().related_products
+        related_data = await collection.find_one({"product_id": product_id})
+        if related_data:
+            return RelatedProducts(**related_data)
+        return None
+
+    @staticmethod
+    async def get_all_related_products() -> List[RelatedProducts]:
+        collection = db.get_database().related_products
+        cursor = collection.find()
+        related = []
+        async for related_data in cursor:
+            related.append(RelatedProducts(**related_data))
+        return related
+
+    @staticmethod
+    async def save_related_products(related: List[RelatedProducts]) -> int:
+        collection = db.get_database().related_products
+        if not related:
+            return 0
+        await collection.create_index("product_id", unique=True)
+        operations = [
+            ReplaceOne(
+                {"product_id": entry.product_id},
+                entry.dict(exclude={"id"}),
+                upsert=True
+            )
+            for entry in related
+        ]
+        result = await collection.bulk_write(operations, ordered=False)
+        return result.modified_count + result.upserted_count
+
+class PricingService:
+    @staticmethod
+    async def get_shipping_rules() -> List[ShippingRule]:
+        collection = db.get_database().shipping_rules
+        cursor = collection.find()
+        rules = []
+        async for rule_data in cursor:
+            rules.append(ShippingRule(**rule_data))
+        return rules
+
+    @staticmethod
+    async def get_tax_rules() -> List[TaxRule]:
+        collection = db.get_database().tax_rules
+        cursor = collection.find()
+        rules = []
+        async for rule_data in cursor:
+            rules.append(TaxRule(**rule_data))
+        return rules
+
+    @staticmethod
+    async def upsert_shipping_rule(rule: ShippingRule) -> ShippingRule:
+        collection = db.get_database().shipping_rules
+        rule.location = rule.location.strip().lower()
+        rule.updated_at = datetime.utcnow()
+        await collection.replace_one({"location": rule.location}, rule.dict(exclude={"id"}), upsert=True)
+        return rule
+
+    @staticmethod
+    async def upsert_tax_rule(rule: TaxRule) -> TaxRule:
+        collection = db.get_database().tax_rules
+        rule.location = rule.location.strip().lower()
+        rule.updated_at = datetime.utcnow()
+        await collection.replace_one({"location": rule.location}, rule.dict(exclude={"id"}), upsert=True)
+        return rule
+
+    @staticmethod
+    async def get_rules_version() -> tuple:
+        """Cheap fingerprint of both rule tables: (count, latest updated_at) each."""
+        database = db.get_database()
+        version = []
+        for collection in (database.shipping_rules, database.tax_rules):
+            latest = await collection.find_one({}, {"updated_at": 1}, sort=[("updated_at", -1)])
+            count = await collection.estimated_document_count()
+            version.append((count, latest["updated_at"] if latest else None))
+        return tuple(version)
+
 class OrderService:
     @staticmethod
     async def get_orders_by_user(user_id: str) -> List[Order]:
@@ -106,10 +206,28 @@ class OrderService:
             return Order(**order_data)
         return None
 
+    @staticmethod
+    async def get_orders_by_ids(order_ids: List[str]) -> List[Order]:
+        collection = db.get_database().orders
+        cursor = collection.find({"_id": {"$in": [ObjectId(order_id) for order_id in order_ids]}})
+        orders = []
+        async for order_data in cursor:
+            orders.append(Order(**order_data))
+        return orders
+
+    @staticmethod
+    async def get_order_product_ids() -> List[List[str]]:
+        collection = db.get_database().orders
+        cursor = collection.find({}, {"items.product_id": 1, "_id": 0})
+        baskets = []
+        async for order_data in cursor:
+            baskets.append([item["product_id"] for item in order_data.get("items", [])])
+        return baskets
+
     @staticmethod
     async def create_order(order: Order) -> Order:
         collection = db.get_database().orders
-        order_dict = order.dict(by_alias=True)
+        order_dict = order.dict(by_alias=True, exclude={"id"})
         result = await collection.insert_one(order_dict)
         order.id = result.inserted_id
         return order
@@ -124,14 +242,55 @@ class DeliveryService:
             deliveries.append(Delivery(**delivery_data))
         return deliveries
 
+    @staticmethod
+    async def get_pending_deliveries() -> List[Delivery]:
+        collection = db.get_database().deliveries
+        cursor = collection.find({"status": "pending"})
+        deliveries = []
+        async for delivery_data in cursor:
+            deliveries.append(Delivery(**delivery_data))
+        return deliveries
+
+    @staticmethod
+    async def get_deliveries_by_ids(delivery_ids: List[str]) -> List[Delivery]:
+        collection = db.get_database().deliveries
+        cursor = collection.find({"_id": {"$in": [ObjectId(delivery_id) for delivery_id in delivery_ids]}})
+        deliveries = []
+        async for delivery_data in cursor:
+            deliveries.append(Delivery(**delivery_data))
+        return deliveries
+
     @staticmethod
     async def create_delivery(delivery: Delivery) -> Delivery:
         collection = db.get_database().deliveries
-        delivery_dict = delivery.dict(by_alias=True)
+        delivery_dict = delivery.dict(by_alias=True, exclude={"id"})
         result = await collection.insert_one(delivery_dict)
         delivery.id = result.inserted_id
         return delivery
 
+    @staticmethod
+    async def assign_batches(batches: List[DeliveryBatch]) -> int:
+        collection = db.get_database().deliveries
+        now = datetime.utcnow()
+        operations = []
+        for batch in batches:
+            for sequence, delivery_id in enumerate(batch.delivery_ids):
+                operations.append(UpdateOne(
+                    # Only claim deliveries that are still pending
+                    {"_id": ObjectId(delivery_id), "status": "pending"},
+                    {"$set": {
+                        "status": "assigned",
+                        "delivery_person_id": batch.delivery_person_id,
+                        "batch_id": batch.batch_id,
+                        "route_sequence": sequence,
+                        "updated_at": now,
+                    }}
+                ))
+        if not operations:
+            return 0
+        result = await collection.bulk_write(operations, ordered=False)
+        return result.modified_count
+
 class FinanceService:
     @staticmethod
     async def get_finances_by_order(order_id: str) -> List[FinanceRecord]:
@@ -145,7 +304,7 @@ class FinanceService:
     @staticmethod
     async def create_finance_record(finance: FinanceRecord) -> FinanceRecord:
         collection = db.get_database().finances
-        finance_dict = finance.dict(by_alias=True)
+        finance_dict = finance.dict(by_alias=True, exclude={"id"})
         result = await collection.insert_one(finance_dict)
         finance.id = result.inserted_id
         return finance
@@ -163,7 +322,7 @@ class ProductionService:
     @staticmethod
     async def create_production_record(record: ProductionRecord) -> ProductionRecord:
         collection = db.get_database().production
-        record_dict = record.dict(by_alias=True)
+        record_dict = record.dict(by_alias=True, exclude={"id"})
         result = await collection.insert_one(record_dict)
         record.id = result.inserted_id
         return record
@@ -172,7 +331,7 @@ class AuditService:
     @staticmethod
     async def log_audit_event(log: AuditLog) -> AuditLog:
         collection = db.get_database().audit_logs
-        log_dict = log.dict(by_alias=True)
+        log_dict = log.dict(by_alias=True, exclude={"id"})
         result = await collection.insert_one(log_dict)
         log.id = result.inserted_id
         return log
@@ -0,0 +1,640 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+from datetime import datetime
+import os
+
+import bson
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+# Hash indexes the in-memory engine builds up front, one per field the
+# services look documents up by. create_index() can add more at runtime.
+LOOKUP_INDEXES: Dict[str, List[str]] = {
+    "users": ["email", "role"],
+    "products": ["slug"],
+    "orders": ["user_id"],
+    "deliveries": ["order_id", "status"],
+    "finances": ["order_id"],
+    "production": ["product_id"],
+    "related_products": ["product_id"],
+    "shipping_rules": ["location"],
+    "tax_rules": ["location"],
+}
+
+# Server error codes, so callers can branch on them like they do against Mongo
+BAD_VALUE = 2
+FAILED_TO_PARSE = 9
+DUPLICATE_KEY = 11000
+
+_MISSING = object()
+_OPERATORS = {"$eq", "$ne", "$in", "$nin", "$gt", "$gte", "$lt", "$lte", "$exists"}
+
+class StorageBackend(ABC):
+    """Where the service layer's collections live."""
+
+    name = ""
+
+    @abstractmethod
+    def get_database(self):
+        """The database object services call `.<collection>` on."""
+
+    def close(self):
+        pass
+
+class MotorBackend(StorageBackend):
+    name = "mongo"
+
+    def __init__(self, url: str):
+        self.client = AsyncIOMotorClient(url)
+
+    def get_database(self):
+        return self.client.plant_ecommerce
+
+    def close(self):
+        self.client.close()
+
+class MemoryBackend(StorageBackend):
+    """Process-local storage, optionally persisted to a BSON snapshot file."""
+
+    name = "memory"
+
+    def __init__(self, snapshot_path: Optional[str] = None):
+        self.snapshot_path = snapshot_path
+        self.database = MemoryDatabase()
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.database.load(snapshot_path)
+
+    def get_database(self):
+        return self.database
+
+    def close(self):
+        if self.snapshot_path:
+            self.database.save(self.snapshot_path)
+
+# Document helpers
+
+def _clone(value: Any) -> Any:
+    """Copy nested dicts and lists; leaves are immutable or treated as such."""
+    if isinstance(value, dict):
+        return {key: _clone(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_clone(item) for item in value]
+    return value
+
+def _resolve(document: Any, path: str) -> List[Any]:
+    """All values at a dotted path, descending into arrays like Mongo does."""
+    values = [document]
+    for part in path.split("."):
+        found = []
+        for value in values:
+            if isinstance(value, dict):
+                if part in value:
+                    found.append(value[part])
+            elif isinstance(value, list):
+                if part.isdigit() and int(part) < len(value):
+                    found.append(value[int(part)])
+                found.extend(item[part] for item in value if isinstance(item, dict) and part in item)
+        values = found
+    return values
+
+def _set_path(document: Dict[str, Any], path: str, value: Any):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        document = document.setdefault(part, {})
+    document[parts[-1]] = value
+
+def _unset_path(document: Dict[str, Any], path: str):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        document = document.get(part)
+        if not isinstance(document, dict):
+            return
+    document.pop(parts[-1], None)
+
+def _get_path(document: Dict[str, Any], path: str, default: Any = None) -> Any:
+    for part in path.split("."):
+        if not isinstance(document, dict) or part not in document:
+            return default
+        document = document[part]
+    return document
+
+def _index_keys(document: Dict[str, Any], field: str) -> Set[Any]:
+    """Hashable keys a document is indexed under; arrays index each element."""
+    values = _resolve(document, field)
+    if not values:
+        return {None}
+    keys = set()
+    for value in values:
+        for item in (value if isinstance(value, list) else [value]):
+            if not isinstance(item, (dict, list)):
+                keys.add(item)
+    return keys
+
+def _compare(left: Any, right: Any, op: str) -> bool:
+    try:
+        if op == "$gt":
+            return left > right
+        if op == "$gte":
+            return left >= right
+        if op == "$lt":
+            return left < right
+        return left <= right
+    except TypeError:
+        return False
+
+def _equals(values: List[Any], target: Any) -> bool:
+    if not values:
+        return target is None
+    for value in values:
+        if value == target or (isinstance(value, list) and target in value):
+            return True
+    return False
+
+def _matches_condition(values: List[Any], condition: Any) -> bool:
+    if isinstance(condition, dict) and condition and all(key in _OPERATORS for key in condition):
+        for op, operand in condition.items():
+            if op == "$eq" and not _equals(values, operand):
+                return False
+            if op == "$ne" and _equals(values, operand):
+                return False
+            if op == "$in" and not any(_equals(values, item) for item in operand):
+                return False
+            if op == "$nin" and any(_equals(values, item) for item in operand):
+                return False
+            if op == "$exists" and bool(values) != bool(operand):
+                return False
+            if op in ("$gt", "$gte", "$lt", "$lte"):
+                flat = [item for value in values for item in (value if isinstance(value, list) else [value])]
+                if not any(_compare(item, operand, op) for item in flat):
+                    return False
+        return True
+    if isinstance(condition, dict) and any(key.startswith("$") for key in condition):
+        raise OperationFailure(f"Unsupported query operator in {condition}", code=BAD_VALUE)
+    return _equals(values, condition)
+
+def _matches(document: Dict[str, Any], query: Mapping[str, Any]) -> bool:
+    for field, condition in query.items():
+        if field == "$and":
+            if not all(_matches(document, sub) for sub in condition):
+                return False
+        elif field == "$or":
+            if not any(_matches(document, sub) for sub in condition):
+                return False
+        elif field.startswith("$"):
+            raise OperationFailure(f"Unsupported query operator {field}", code=BAD_VALUE)
+        elif not _matches_condition(_resolve(document, field), condition):
+            return False
+    return True
+
+def _project(document: Dict[str, Any], projection: Optional[Mapping[str, Any]]) -> Dict[str, Any]:
+    if not projection:
+        return _clone(document)
+    include_id = bool(projection.get("_id", 1))
+    fields = {field: flag for field, flag in projection.items() if field != "_id"}
+    if fields and all(fields.values()):
+        result: Dict[str, Any] = {}
+        for field in fields:
+            _copy_path(document, result, field.split("."))
+    else:
+        result = _clone(document)
+        for field in fields:
+            _unset_path(result, field)
+    if include_id and "_id" in document:
+        result["_id"] = document["_id"]
+    elif not include_id:
+        result.pop("_id", None)
+    return result
+
+def _copy_path(source: Any, target: Dict[str, Any], parts: List[str]):
+    head, rest = parts[0], parts[1:]
+    if not isinstance(source, dict) or head not in source:
+        return
+    value = source[head]
+    if not rest:
+        target[head] = _clone(value)
+    elif isinstance(value, list):
+        items = target.setdefault(head, [{} for _ in value])
+        for item, slot in zip(value, items):
+            _copy_path(item, slot, rest)
+    else:
+        _copy_path(value, target.setdefault(head, {}), rest)
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    """Key that orders mixed types like Mongo's BSON comparison order:
+    null/missing < numbers < strings < objects < arrays < binary < ObjectId
+    < booleans < dates. Values within a type compare naturally.
+    """
+    if value is None or value is _MISSING:
+        return (1, 0)
+    # bool before numbers: it is an int subclass but sorts on its own
+    if isinstance(value, bool):
+        return (8, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    if isinstance(value, dict):
+        return (4, tuple((key, _sort_key(item)) for key, item in value.items()))
+    if isinstance(value, list):
+        return (5, tuple(_sort_key(item) for item in value))
+    if isinstance(value, bytes):
+        return (6, value)
+    if isinstance(value, ObjectId):
+        return (7, value)
+    if isinstance(value, datetime):
+        return (9, value)
+    return (10, repr(value))
+
+def _field_sort_key(value: Any, descending: bool) -> Tuple[int, Any]:
+    # Arrays sort by their smallest element ascending and largest descending;
+    # an empty array sorts before null
+    if isinstance(value, list):
+        if not value:
+            return (0, 0)
+        keys = [_sort_key(item) for item in value]
+        return max(keys) if descending else min(keys)
+    return _sort_key(value)
+
+def _sort(documents: List[Dict[str, Any]], sort: Iterable[Tuple[str, int]]) -> List[Dict[str, Any]]:
+    for field, direction in reversed(list(sort)):
+        descending = direction < 0
+        documents.sort(key=lambda doc: _field_sort_key(_get_path(doc, field, _MISSING), descending), reverse=descending)
+    return documents
+
+def _normalize_sort(key_or_list: Any, direction: Optional[int] = None) -> List[Tuple[str, int]]:
+    if key_or_list is None:
+        return []
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    return [(field, order) for field, order in key_or_list]
+
+def _apply_update(document: Dict[str, Any], update: Mapping[str, Any], inserting: bool = False) -> Dict[str, Any]:
+    if not any(key.startswith("$") for key in update):
+        # Whole-document replacement keeps the _id
+        replacement = _clone(dict(update))
+        if "_id" in document:
+            replacement["_id"] = document["_id"]
+        return replacement
+    updated = _clone(document)
+    for op, fields in update.items():
+        if op == "$set" or (op == "$setOnInsert" and inserting):
+            for path, value in fields.items():
+                _set_path(updated, path, _clone(value))
+        elif op == "$setOnInsert":
+            continue
+        elif op == "$unset":
+            for path in fields:
+                _unset_path(updated, path)
+        elif op == "$inc":
+            for path, amount in fields.items():
+                _set_path(updated, path, _get_path(updated, path, 0) + amount)
+        else:
+            raise OperationFailure(f"Unsupported update operator {op}", code=FAILED_TO_PARSE)
+    return updated
+
+def _upsert_base(query: Mapping[str, Any]) -> Dict[str, Any]:
+    """Seed document for an upsert from the filter's equality clauses."""
+    document: Dict[str, Any] = {}
+    for field, condition in query.items():
+        if field.startswith("$"):
+            continue
+        if isinstance(condition, dict) and any(key.startswith("$") for key in condition):
+            if "$eq" in condition:
+                _set_path(document, field, _clone(condition["$eq"]))
+            continue
+        _set_path(document, field, _clone(condition))
+    return document
+
+class MemoryCursor:
+    def __init__(self, documents: List[Dict[str, Any]], projection: Optional[Mapping[str, Any]] = None):
+        self.documents = documents
+        self.projection = projection
+        self.sort_spec: List[Tuple[str, int]] = []
+        self.skip_count = 0
+        self.limit_count = 0
+        self.results: Optional[List[Dict[str, Any]]] = None
+
+    def sort(self, key_or_list: Any, direction: Optional[int] = None) -> "MemoryCursor":
+        self.sort_spec = _normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, count: int) -> "MemoryCursor":
+        self.skip_count = count
+        return self
+
+    def limit(self, count: int) -> "MemoryCursor":
+        self.limit_count = count
+        return self
+
+    def _materialize(self) -> List[Dict[str, Any]]:
+        if self.results is None:
+            documents = _sort(list(self.documents), self.sort_spec) if self.sort_spec else self.documents
+            documents = documents[self.skip_count:]
+            if self.limit_count:
+                documents = documents[:self.limit_count]
+            self.results = [_project(document, self.projection) for document in documents]
+        return self.results
+
+    def __aiter__(self):
+        self.position = 0
+        self._materialize()
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        if self.position >= len(self.results):
+            raise StopAsyncIteration
+        self.position += 1
+        return self.results[self.position - 1]
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        results = self._materialize()
+        return results if length is None else results[:length]
+
+class MemoryCollection:
+    """Dict-backed collection with hash indexes and Motor-style async methods.
+
+    Supports the query operators, update operators and bulk operations the
+    service layer uses; anything else raises OperationFailure.
+    """
+
+    def __init__(self, name: str, index_fields: Iterable[str] = ()):
+        self.name = name
+        self.documents: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+        self.indexes: Dict[str, Dict[Any, Set[Any]]] = {}
+        self.unique: Set[str] = set()
+        for field in index_fields:
+            self.indexes[field] = {}
+
+    # Indexes
+
+    async def create_index(self, keys: Any, unique: bool = False, **kwargs) -> str:
+        return self._ensure_index(_normalize_sort(keys)[0][0], unique)
+
+    def _ensure_index(self, field: str, unique: bool = False) -> str:
+        if field not in self.indexes:
+            self.indexes[field] = {}
+            for document_id, document in self.documents.items():
+                self._index_one(field, document_id, document)
+        if unique:
+            for key, ids in self.indexes[field].items():
+                if len(ids) > 1 and key is not None:
+                    raise DuplicateKeyError(
+                        f"E11000 duplicate key error collection: {self.name} index: {field}_1", code=DUPLICATE_KEY
+                    )
+            self.unique.add(field)
+        return f"{field}_1"
+
+    def _index_one(self, field: str, document_id: Any, document: Dict[str, Any]):
+        for key in _index_keys(document, field):
+            self.indexes[field].setdefault(key, set()).add(document_id)
+
+    def _unindex(self, document_id: Any, document: Dict[str, Any]):
+        for field, index in self.indexes.items():
+            for key in _index_keys(document, field):
+                ids = index.get(key)
+                if ids is not None:
+                    ids.discard(document_id)
+                    if not ids:
+                        del index[key]
+
+    def _check_unique(self, document_id: Any, document: Dict[str, Any]):
+        for field in self.unique:
+            for key in _index_keys(document, field):
+                if key is None:
+                    continue
+                if self.indexes[field].get(key, set()) - {document_id}:
+                    raise DuplicateKeyError(
+                        f"E11000 duplicate key error collection: {self.name} index: {field}_1 dup key: {key!r}",
+                        code=DUPLICATE_KEY
+                    )
+
+    def _store(self, document_id: Any, document: Dict[str, Any], previous: Optional[Dict[str, Any]] = None):
+        if previous is not None:
+            self._unindex(document_id, previous)
+        try:
+            self._check_unique(document_id, document)
+        except DuplicateKeyError:
+            if previous is not None:
+                for field in self.indexes:
+                    self._index_one(field, document_id, previous)
+            raise
+        self.documents[document_id] = document
+        for field in self.indexes:
+            self._index_one(field, document_id, document)
+
+    # Queries
+
+    def _candidates(self, query: Mapping[str, Any]) -> Iterable[Any]:
+        """Document ids worth checking, narrowed by _id or a hash index when possible."""
+        best: Optional[Iterable[Any]] = None
+        for field, condition in query.items():
+            if field != "_id" and field not in self.indexes:
+                continue
+            if isinstance(condition, dict) and set(condition) == {"$in"}:
+                keys = list(condition["$in"])
+            elif isinstance(condition, dict) and set(condition) == {"$eq"}:
+                keys = [condition["$eq"]]
+            elif isinstance(condition, (dict, list)):
+                continue
+            else:
+                keys = [condition]
+            if any(isinstance(key, (dict, list)) for key in keys):
+                continue
+            if field == "_id":
+                ids = [key for key in keys if key in self.documents]
+            elif len(keys) == 1:
+                ids = self.indexes[field].get(keys[0], ())
+            else:
+                ids = set().union(*(self.indexes[field].get(key, ()) for key in keys))
+            if best is None or len(ids) < len(best):
+                best = ids
+                if len(best) <= 1:
+                    break
+        # Copy, since callers may write while walking the result
+        return list(self.documents) if best is None else list(best)
+
+    def _find_ids(self, query: Optional[Mapping[str, Any]], limit: int = 0) -> List[Any]:
+        query = query or {}
+        ids = []
+        for document_id in self._candidates(query):
+            document = self.documents.get(document_id)
+            if document is not None and _matches(document, query):
+                ids.append(document_id)
+                if limit and len(ids) == limit:
+                    break
+        return ids
+
+    def find(self, filter: Optional[Mapping[str, Any]] = None, projection: Optional[Mapping[str, Any]] = None,
+             sort: Any = None, skip: int = 0, limit: int = 0) -> MemoryCursor:
+        cursor = MemoryCursor([self.documents[document_id] for document_id in self._find_ids(filter)], projection)
+        if sort:
+            cursor.sort(sort)
+        return cursor.skip(skip).limit(limit)
+
+    async def find_one(self, filter: Optional[Mapping[str, Any]] = None,
+                       projection: Optional[Mapping[str, Any]] = None, sort: Any = None) -> Optional[Dict[str, Any]]:
+        if isinstance(filter, ObjectId):
+            filter = {"_id": filter}
+        if sort:
+            results = await self.find(filter, projection, sort=sort, limit=1).to_list()
+            return results[0] if results else None
+        ids = self._find_ids(filter, limit=1)
+        return _project(self.documents[ids[0]], projection) if ids else None
+
+    async def count_documents(self, filter: Optional[Mapping[str, Any]] = None) -> int:
+        return len(self._find_ids(filter))
+
+    async def estimated_document_count(self) -> int:
+        return len(self.documents)
+
+    # Writes
+
+    def _insert(self, document: Dict[str, Any]) -> Any:
+        if document.get("_id") is None:
+            document["_id"] = ObjectId()
+        document_id = document["_id"]
+        if document_id in self.documents:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.name} index: _id_ dup key: {document_id!r}",
+                code=DUPLICATE_KEY
+            )
+        self._store(document_id, _clone(document))
+        return document_id
+
+    def _update(self, query: Mapping[str, Any], update: Mapping[str, Any], upsert: bool, many: bool,
+                replace: bool = False) -> Dict[str, Any]:
+        if replace and any(key.startswith("$") for key in update):
+            raise ValueError("replacement document must not contain update operators")
+        ids = self._find_ids(query, limit=0 if many else 1)
+        if not ids and upsert:
+            document = _upsert_base(query) if not replace else {}
+            document = _apply_update(document, update, inserting=True)
+            base_id = _get_path(dict(query), "_id")
+            if "_id" not in document and base_id is not None and not isinstance(base_id, dict):
+                document["_id"] = base_id
+            return {"n": 1, "nModified": 0, "upserted": self._insert(document)}
+        modified = 0
+        for document_id in ids:
+            previous = self.documents[document_id]
+            document = _apply_update(previous, update)
+            if document != previous:
+                self._store(document_id, document, previous)
+                modified += 1
+        return {"n": len(ids), "nModified": modified}
+
+    def _delete(self, query: Mapping[str, Any], many: bool) -> int:
+        ids = self._find_ids(query, limit=0 if many else 1)
+        for document_id in ids:
+            self._unindex(document_id, self.documents.pop(document_id))
+        return len(ids)
+
+    async def insert_one(self, document: Dict[str, Any]) -> InsertOneResult:
+        return InsertOneResult(self._insert(document), True)
+
+    async def insert_many(self, documents: Iterable[Dict[str, Any]], ordered: bool = True) -> InsertManyResult:
+        return InsertManyResult([self._insert(document) for document in documents], True)
+
+    async def update_one(self, filter: Mapping[str, Any], update: Mapping[str, Any], upsert: bool = False) -> UpdateResult:
+        return UpdateResult(self._update(filter, update, upsert, many=False), True)
+
+    async def update_many(self, filter: Mapping[str, Any], update: Mapping[str, Any], upsert: bool = False) -> UpdateResult:
+        return UpdateResult(self._update(filter, update, upsert, many=True), True)
+
+    async def replace_one(self, filter: Mapping[str, Any], replacement: Mapping[str, Any], upsert: bool = False) -> UpdateResult:
+        return UpdateResult(self._update(filter, replacement, upsert, many=False, replace=True), True)
+
+    async def delete_one(self, filter: Mapping[str, Any]) -> DeleteResult:
+        return DeleteResult({"n": self._delete(filter, many=False)}, True)
+
+    async def delete_many(self, filter: Mapping[str, Any]) -> DeleteResult:
+        return DeleteResult({"n": self._delete(filter, many=True)}, True)
+
+    async def bulk_write(self, requests: List[Any], ordered: bool = True) -> BulkWriteResult:
+        result: Dict[str, Any] = {
+            "writeErrors": [], "writeConcernErrors": [], "nInserted": 0, "nUpserted": 0,
+            "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [],
+        }
+        for position, request in enumerate(requests):
+            try:
+                if isinstance(request, InsertOne):
+                    self._insert(request._doc)
+                    result["nInserted"] += 1
+                elif isinstance(request, DeleteOne) or isinstance(request, DeleteMany):
+                    result["nRemoved"] += self._delete(request._filter, many=isinstance(request, DeleteMany))
+                elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                    outcome = self._update(
+                        request._filter, request._doc, request._upsert,
+                        many=isinstance(request, UpdateMany), replace=isinstance(request, ReplaceOne)
+                    )
+                    if "upserted" in outcome:
+                        result["nUpserted"] += 1
+                        result["upserted"].append({"index": position, "_id": outcome["upserted"]})
+                    else:
+                        result["nMatched"] += outcome["n"]
+                        result["nModified"] += outcome["nModified"]
+                else:
+                    raise TypeError(f"{request!r} is not a valid request")
+            except (DuplicateKeyError, OperationFailure) as e:
+                result["writeErrors"].append({"index": position, "code": e.code, "errmsg": str(e), "op": request})
+                if ordered:
+                    break
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+class MemoryDatabase:
+    """Attribute-style access to in-memory collections, like a Motor database."""
+
+    def __init__(self):
+        self.collections: Dict[str, MemoryCollection] = {}
+
+    def get_collection(self, name: str) -> MemoryCollection:
+        collection = self.collections.get(name)
+        if collection is None:
+            collection = MemoryCollection(name, LOOKUP_INDEXES.get(name, ()))
+            self.collections[name] = collection
+        return collection
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        return self.get_collection(name)
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.get_collection(name)
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("Change streams are not supported by the in-memory storage engine", code=40573)
+
+    def save(self, path: str):
+        """Write every collection to a BSON snapshot, replacing `path` atomically.
+
+        Each collection starts with an entry listing its indexes, so unique
+        constraints added by create_index() survive a restart.
+        """
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as snapshot:
+            for name, collection in self.collections.items():
+                snapshot.write(bson.encode({
+                    "collection": name,
+                    "indexes": list(collection.indexes),
+                    "unique": sorted(collection.unique),
+                }))
+                for document in collection.documents.values():
+                    snapshot.write(bson.encode({"collection": name, "document": document}))
+        os.replace(temporary, path)
+
+    def load(self, path: str):
+        with open(path, "rb") as snapshot:
+            for entry in bson.decode_file_iter(snapshot):
+                collection = self.get_collection(entry["collection"])
+                if "document" in entry:
+                    collection._insert(entry["document"])
+                    continue
+                unique = set(entry.get("unique", []))
+                for field in entry.get("indexes", []):
+                    collection._ensure_index(field, unique=field in unique)
@@ -0,0 +1,17 @@
+import os
+import sys
+
+# The API modules are flat files imported by name, as when running main.py directly
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from database import db
+from storage import MemoryBackend
+
+@pytest.fixture
+def memory_db():
+    """A fresh in-memory storage engine behind the service layer."""
+    db.use_backend(MemoryBackend())
+    yield db.get_database()
+    db.use_backend(MemoryBackend())
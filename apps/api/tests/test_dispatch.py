@@ -0,0 +1,148 @@
+import itertools
+
+import numpy as np
+import pytest
+from bson import ObjectId
+
+from dispatch import (
+    ZONE_DEPOTS,
+    allocate_couriers,
+    haversine_matrix,
+    keep_claimed,
+    path_length,
+    plan_batches,
+    solve_route,
+    two_opt,
+)
+from models import Delivery
+
+def make_deliveries(zone, count, seed=0, located=True):
+    rng = np.random.default_rng(seed)
+    lat, lon = ZONE_DEPOTS[zone]
+    return [
+        Delivery(
+            _id=ObjectId(),
+            order_id=str(ObjectId()),
+            status="pending",
+            zone=zone,
+            latitude=lat + rng.normal(0, 0.05) if located else None,
+            longitude=lon + rng.normal(0, 0.05) if located else None,
+        )
+        for _ in range(count)
+    ]
+
+def route_points(batch, deliveries):
+    by_id = {str(delivery.id): delivery for delivery in deliveries}
+    return np.array(
+        [ZONE_DEPOTS[batch.zone]]
+        + [(by_id[delivery_id].latitude, by_id[delivery_id].longitude) for delivery_id in batch.delivery_ids]
+    )
+
+# Routing
+
+@pytest.mark.parametrize("seed", range(5))
+def test_solve_route_is_a_valid_order_with_its_true_length(seed):
+    rng = np.random.default_rng(seed)
+    depot = ZONE_DEPOTS["dhaka"]
+    coords = np.array(depot) + rng.normal(0, 0.05, size=(7, 2))
+
+    order, length = solve_route(coords, depot)
+    assert sorted(order.tolist()) == list(range(len(coords)))
+    assert length == pytest.approx(path_length(np.vstack([depot, coords[order]])))
+
+    # No visiting order can beat the optimum found by brute force
+    dist = haversine_matrix(np.vstack([depot, coords]))
+    best = min(
+        dist[(0,) + permutation, permutation + (0,)][:-1].sum()
+        for permutation in itertools.permutations(range(1, len(coords) + 1))
+    )
+    assert length >= best - 1e-9
+    assert length <= best * 1.25
+
+def test_two_opt_never_lengthens_and_keeps_endpoints():
+    rng = np.random.default_rng(3)
+    points = rng.uniform(0, 1, size=(12, 2)) + ZONE_DEPOTS["dhaka"]
+    dist = haversine_matrix(points)
+    route = rng.permutation(12)
+
+    improved = two_opt(route, dist)
+    assert sorted(improved.tolist()) == list(range(12))
+    assert (improved[0], improved[-1]) == (route[0], route[-1])
+    assert dist[improved[:-1], improved[1:]].sum() <= dist[route[:-1], route[1:]].sum() + 1e-9
+
+# Batches
+
+def test_batches_are_valid_routes_with_reported_lengths():
+    deliveries = make_deliveries("dhaka", 23, seed=1) + make_deliveries("chittagong", 9, seed=2)
+    batches = plan_batches(deliveries, ["c1", "c2", "c3"], max_stops=5)
+
+    assigned = [delivery_id for batch in batches for delivery_id in batch.delivery_ids]
+    assert sorted(assigned) == sorted(str(delivery.id) for delivery in deliveries)
+    for batch in batches:
+        assert batch.routed and 1 <= len(batch.delivery_ids) <= 5
+        assert batch.distance_km == pytest.approx(path_length(route_points(batch, deliveries)), abs=1e-3)
+
+def test_each_courier_works_one_zone():
+    deliveries = (
+        make_deliveries("dhaka", 30, seed=1)
+        + make_deliveries("chittagong", 10, seed=2)
+        + make_deliveries("other", 5, seed=3, located=False)
+    )
+    batches = plan_batches(deliveries, ["c1", "c2", "c3", "c4"], max_stops=4)
+
+    zones_by_courier = {}
+    for batch in batches:
+        zones_by_courier.setdefault(batch.delivery_person_id, set()).add(batch.zone)
+    assert all(len(zones) == 1 for zones in zones_by_courier.values())
+    assert {batch.zone for batch in batches} == {"dhaka", "chittagong", "other"}
+
+def test_pinned_couriers_keep_their_zone():
+    deliveries = make_deliveries("dhaka", 20, seed=1) + make_deliveries("chittagong", 2, seed=2)
+    batches = plan_batches(deliveries, ["c1", "c2"], max_stops=5, courier_zones={"c1": "Chittagong"})
+
+    assert {batch.zone for batch in batches if batch.delivery_person_id == "c1"} == {"chittagong"}
+    assert {batch.zone for batch in batches if batch.delivery_person_id == "c2"} == {"dhaka"}
+
+def test_deliveries_without_coordinates_are_not_routed():
+    located = make_deliveries("dhaka", 3, seed=1)
+    unlocated = make_deliveries("dhaka", 4, seed=2, located=False)
+    batches = plan_batches(located + unlocated, ["c1"], max_stops=10)
+
+    by_kind = {batch.routed: batch for batch in batches}
+    assert set(by_kind) == {True, False}
+    assert sorted(by_kind[False].delivery_ids) == sorted(str(delivery.id) for delivery in unlocated)
+    assert by_kind[False].distance_km is None
+    assert by_kind[True].distance_km > 0
+
+def test_zones_without_a_courier_stay_pending():
+    deliveries = make_deliveries("dhaka", 6, seed=1) + make_deliveries("chittagong", 6, seed=2)
+    # Both couriers are pinned to Dhaka, so nobody can take Chittagong
+    batches = plan_batches(deliveries, ["c1", "c2"], courier_zones={"c1": "dhaka", "c2": "dhaka"})
+
+    assert {batch.zone for batch in batches} == {"dhaka"}
+    assert sum(len(batch.delivery_ids) for batch in batches) == 6
+
+def test_allocate_couriers_covers_busy_zones_first():
+    allocation = allocate_couriers({"dhaka": 40, "chittagong": 10, "other": 2}, ["c1", "c2", "c3", "c4"])
+
+    assert all(allocation[zone] for zone in ("dhaka", "chittagong", "other"))
+    assert len(allocation["dhaka"]) == 2
+    assert sorted(sum(allocation.values(), [])) == ["c1", "c2", "c3", "c4"]
+
+def test_nothing_to_plan():
+    assert plan_batches([], ["c1"]) == []
+    assert plan_batches(make_deliveries("dhaka", 2), []) == []
+
+# Claimed deliveries
+
+def test_keep_claimed_trims_batches_and_remeasures():
+    deliveries = make_deliveries("dhaka", 8, seed=4)
+    batches = plan_batches(deliveries, ["c1"], max_stops=4)
+    claimed = set(batches[0].delivery_ids[::2])
+
+    kept = keep_claimed(batches, claimed, deliveries)
+    assert len(kept) == 1
+    assert kept[0].delivery_ids == batches[0].delivery_ids[::2]
+    assert kept[0].batch_id == batches[0].batch_id
+    assert kept[0].distance_km == pytest.approx(path_length(route_points(kept[0], deliveries)), abs=1e-3)
+    assert keep_claimed(batches, set(), deliveries) == []
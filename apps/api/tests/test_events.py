@@ -0,0 +1,95 @@
+import asyncio
+
+from pymongo.errors import AutoReconnect
+
+import events
+from database import db
+from events import EventBroker, order_topic
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+async def connected():
+    return False
+
+def test_unstarted_stream_leaves_no_subscriber():
+    broker = EventBroker()
+
+    async def abandon():
+        # The client went away before the response body started
+        await broker.stream(order_topic("o1"), connected).aclose()
+
+    run(abandon())
+    assert broker.connections == 0 and broker.topics == {}
+
+def test_stream_subscribes_while_running():
+    broker = EventBroker()
+
+    async def follow():
+        body = broker.stream(order_topic("o1"), connected)
+        assert (await body.__anext__()).startswith("retry:")
+        assert broker.connections == 1 and order_topic("o1") in broker.topics
+        await body.aclose()
+
+    run(follow())
+    assert broker.connections == 0 and broker.topics == {}
+
+class FlakyChangeStream:
+    """Delivers one change, then drops the connection."""
+
+    def __init__(self, changes):
+        self.changes = changes
+        self.resume_token = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.changes:
+            raise AutoReconnect("connection reset")
+        change = self.changes.pop(0)
+        self.resume_token = change["_id"]
+        return change
+
+class FlakyDatabase:
+    def __init__(self):
+        self.resumed_after = []
+        self.reconnected = asyncio.Event()
+
+    def watch(self, pipeline, full_document=None, resume_after=None):
+        self.resumed_after.append(resume_after)
+        if len(self.resumed_after) > 1:
+            self.reconnected.set()
+            # Stay down so the test can look at the broker mid-gap
+            return FlakyChangeStream([])
+        return FlakyChangeStream([{
+            "_id": {"_data": "82A1"},
+            "operationType": "insert",
+            "ns": {"coll": "orders"},
+            "fullDocument": {"_id": "o1", "user_id": "u1", "status": "pending"},
+        }])
+
+def test_interrupted_change_stream_keeps_local_publishing_off(monkeypatch):
+    monkeypatch.setattr(events, "RECONNECT_SECONDS", 0.01)
+    broker = EventBroker()
+
+    async def scenario():
+        # Built inside the loop: asyncio.Event binds to it on Python 3.9
+        flaky = FlakyDatabase()
+        monkeypatch.setattr(db, "get_database", lambda: flaky)
+        broker.start()
+        await asyncio.wait_for(flaky.reconnected.wait(), timeout=1)
+        mode = broker.mode
+        await broker.stop()
+        return mode, flaky.resumed_after
+
+    mode, resumed_after = run(scenario())
+    # The resumed stream will replay the gap, so local events would be duplicates
+    assert mode == "change_stream"
+    assert resumed_after[1] == {"_data": "82A1"}
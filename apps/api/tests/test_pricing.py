@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from models import CartItem, Product, ProductAttribute, ShippingRule, TaxRule
+from pricing import PricingEngine
+from services import PricingService, ProductService
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+async def add_product(price: float) -> str:
+    product = await ProductService.create_product(Product(
+        title=f"Plant {price}",
+        slug=f"plant-{price}",
+        description="Test product",
+        price=price,
+        stock=10,
+        images=[],
+        status="published",
+        attributes=ProductAttribute(usda_zone="10a", light="Full Sun", water="Medium"),
+        solution_tags=[],
+        genus="Petunia",
+        common_name="petunia",
+    ))
+    return str(product.id)
+
+def test_duplicate_lines_are_merged(memory_db):
+    async def scenario():
+        product_id = await add_product(100.0)
+        quote = await PricingEngine().quote(
+            [CartItem(product_id=product_id, quantity=1), CartItem(product_id=product_id, quantity=2)],
+            "Dhaka"
+        )
+        return product_id, quote
+
+    product_id, quote = run(scenario())
+    assert [(line.product_id, line.quantity, line.line_total) for line in quote.items] == [(product_id, 3, 300.0)]
+    assert quote.shipping_location == "dhaka"
+    assert (quote.subtotal, quote.shipping_cost, quote.tax, quote.total) == (300.0, 80.0, 15.0, 395.0)
+
+def test_unknown_locations_fall_back_to_other(memory_db):
+    async def scenario():
+        product_id = await add_product(100.0)
+        engine = PricingEngine()
+        items = [CartItem(product_id=product_id, quantity=1)]
+        built_in = await engine.quote(items, "Sylhet")
+        await PricingService.upsert_shipping_rule(ShippingRule(location="other", base_cost=200.0))
+        await PricingService.upsert_tax_rule(TaxRule(location="other", rate=0.1))
+        engine.invalidate()
+        return built_in, await engine.quote(items, "Sylhet"), await engine.quote(items, "chittagong")
+
+    built_in, stored, chittagong = run(scenario())
+    assert (built_in.shipping_cost, built_in.tax) == (150.0, 5.0)
+    assert (stored.shipping_cost, stored.tax) == (200.0, 10.0)
+    # Locations with their own default keep it, but pick up the stored tax fallback
+    assert (chittagong.shipping_cost, chittagong.tax) == (120.0, 10.0)
+
+def test_free_shipping_over_threshold(memory_db):
+    async def scenario():
+        product_id = await add_product(250.0)
+        await PricingService.upsert_shipping_rule(
+            ShippingRule(location="dhaka", base_cost=60.0, per_item_cost=5.0, free_over=500.0)
+        )
+        engine = PricingEngine()
+        below = await engine.quote([CartItem(product_id=product_id, quantity=1)], "dhaka")
+        at = await engine.quote([CartItem(product_id=product_id, quantity=2)], "dhaka")
+        return below, at
+
+    below, at = run(scenario())
+    assert below.shipping_cost == 65.0
+    assert at.shipping_cost == 0.0 and at.total == 525.0
+
+def test_amounts_are_rounded_to_cents(memory_db):
+    async def scenario():
+        product_id = await add_product(19.999)
+        await PricingService.upsert_tax_rule(TaxRule(location="dhaka", rate=0.075))
+        return await PricingEngine().quote([CartItem(product_id=product_id, quantity=3)], "dhaka")
+
+    quote = run(scenario())
+    assert quote.items[0].line_total == 60.0
+    assert (quote.subtotal, quote.tax, quote.total) == (60.0, 4.5, 144.5)
+
+def test_unknown_and_invalid_products_are_rejected(memory_db):
+    missing = str(ObjectId())
+
+    async def scenario():
+        product_id = await add_product(100.0)
+        await PricingEngine().quote(
+            [CartItem(product_id=product_id, quantity=1), CartItem(product_id=missing, quantity=1),
+             CartItem(product_id="not-an-id", quantity=1)],
+            "dhaka"
+        )
+
+    with pytest.raises(ValueError) as error:
+        run(scenario())
+    assert missing in str(error.value) and "not-an-id" in str(error.value)
+
+def test_empty_cart_is_rejected(memory_db):
+    with pytest.raises(ValueError):
+        run(PricingEngine().quote([], "dhaka"))
+
+def test_invalidate_forces_a_reload(memory_db):
+    async def scenario():
+        product_id = await add_product(100.0)
+        engine = PricingEngine()
+        items = [CartItem(product_id=product_id, quantity=1)]
+        before = await engine.quote(items, "dhaka")
+        await PricingService.upsert_shipping_rule(ShippingRule(location="dhaka", base_cost=40.0))
+        # Still inside the check interval, so the edit is not seen yet
+        cached = await engine.quote(items, "dhaka")
+        engine.invalidate()
+        return before, cached, await engine.quote(items, "dhaka")
+
+    before, cached, after = run(scenario())
+    assert before.shipping_cost == cached.shipping_cost == 80.0
+    assert after.shipping_cost == 40.0
+
+def test_cached_quotes_are_copies(memory_db):
+    async def scenario():
+        product_id = await add_product(100.0)
+        engine = PricingEngine()
+        items = [CartItem(product_id=product_id, quantity=1)]
+        first = await engine.quote(items, "dhaka")
+        first.total = 0.0
+        first.items[0].quantity = 99
+        return first, await engine.quote(items, "dhaka")
+
+    first, second = run(scenario())
+    assert second is not first
+    assert second.total == 185.0 and second.items[0].quantity == 1
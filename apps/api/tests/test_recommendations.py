@@ -0,0 +1,67 @@
+import numpy as np
+from bson import ObjectId
+
+from models import Product, ProductAttribute
+from recommendations import MAX_USDA_ZONE, co_purchase_matrix, encode_products, similarity, top_k_related
+
+def make_product(genus, tags, zone="10a", light="Full Sun", water="Medium"):
+    return Product(
+        _id=ObjectId(),
+        title=genus,
+        slug=genus.lower(),
+        description="Test product",
+        price=100.0,
+        stock=1,
+        images=[],
+        status="published",
+        attributes=ProductAttribute(usda_zone=zone, light=light, water=water),
+        solution_tags=tags,
+        genus=genus,
+        common_name=genus.lower(),
+    )
+
+CATALOG = [
+    make_product("Petunia", ["Container Gardening", "Pollinator Friendly"]),
+    make_product("Petunia", ["Container Gardening"], zone="11a"),
+    make_product("Coleus", ["Shade Loving"], light="Full Shade", water="High"),
+    make_product("Hosta", ["Shade Loving", "Deer Resistant"], zone="", light="Full Shade"),
+]
+
+def test_features_are_sparse_unit_rows():
+    features = encode_products(CATALOG)
+
+    assert features.n_rows == len(CATALOG)
+    # Zone columns plus one per distinct genus, tag, light and water value
+    assert features.n_cols == MAX_USDA_ZONE + 2 + 3 + 4 + 2 + 2
+    # Three zone entries (none without a zone), one per tag, genus, light and water
+    assert len(features.values) == 8 + 7 + 7 + 5
+    dense = features.dense_rows(np.arange(len(CATALOG)))
+    assert np.allclose(np.linalg.norm(dense, axis=1), 1.0)
+
+def test_similarity_matches_dense_cosine():
+    features = encode_products(CATALOG)
+    dense = features.dense_rows(np.arange(len(CATALOG)))
+
+    scores = similarity(features, np.array([0, 3]))
+    assert np.allclose(scores, dense[[0, 3]] @ dense.T)
+    assert scores[0, 1] > scores[0, 2]
+
+def test_co_purchase_counts_pairs_once_per_order():
+    ids = [str(product.id) for product in CATALOG]
+    index = {product_id: row for row, product_id in enumerate(ids)}
+    baskets = [[ids[0], ids[1], ids[0]], [ids[0], ids[1]], [ids[2], "unknown"], [ids[1], ids[3]]]
+
+    counts = co_purchase_matrix(baskets, index).dense_rows(np.arange(len(ids)))
+    expected = np.zeros((4, 4), dtype=np.float32)
+    expected[0, 1] = expected[1, 0] = 2
+    expected[1, 3] = expected[3, 1] = 1
+    assert np.array_equal(counts, expected)
+
+def test_top_k_excludes_the_product_itself():
+    features = encode_products(CATALOG)
+    indices, scores = top_k_related(features, k=2)
+
+    assert indices.shape == (len(CATALOG), 2)
+    assert all(row not in indices[row] for row in range(len(CATALOG)))
+    assert indices[0, 0] == 1 and indices[2, 0] == 3
+    assert np.all(scores[:, 0] >= scores[:, 1])
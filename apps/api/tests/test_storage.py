@@ -0,0 +1,227 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from pymongo import InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+from storage import DUPLICATE_KEY, MemoryBackend, MemoryCollection, StorageBackend, _matches, _project
+
+PLANT = {
+    "_id": 1,
+    "title": "Supertunia",
+    "price": 250,
+    "stock": 0,
+    "solution_tags": ["Container Gardening", "Pollinator Friendly"],
+    "attributes": {"usda_zone": "10a", "light": "Full Sun"},
+    "items": [{"product_id": "a", "quantity": 2}, {"product_id": "b", "quantity": 1}],
+}
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+# Queries
+
+@pytest.mark.parametrize("query, expected", [
+    ({"title": "Supertunia"}, True),
+    ({"title": "Coleus"}, False),
+    ({"attributes.light": "Full Sun"}, True),
+    ({"solution_tags": "Container Gardening"}, True),
+    ({"items.product_id": "b"}, True),
+    ({"items.0.quantity": 2}, True),
+    ({"price": {"$gte": 250, "$lt": 300}}, True),
+    ({"price": {"$gt": 250}}, False),
+    ({"price": {"$gt": "100"}}, False),
+    ({"title": {"$in": ["Coleus", "Supertunia"]}}, True),
+    ({"title": {"$nin": ["Supertunia"]}}, False),
+    ({"title": {"$ne": "Coleus"}}, True),
+    ({"genus": None}, True),
+    ({"genus": {"$exists": False}}, True),
+    ({"stock": {"$exists": True}}, True),
+    ({"$or": [{"price": 1}, {"stock": 0}]}, True),
+    ({"$and": [{"price": 250}, {"stock": 1}]}, False),
+])
+def test_matches(query, expected):
+    assert _matches(PLANT, query) is expected
+
+def test_matches_rejects_unsupported_operators():
+    with pytest.raises(OperationFailure):
+        _matches(PLANT, {"title": {"$regex": "^Super"}})
+    with pytest.raises(OperationFailure):
+        _matches(PLANT, {"$where": "true"})
+
+def test_find_uses_indexes_and_sees_later_writes():
+    collection = MemoryCollection("deliveries", ["status"])
+    run(collection.insert_many([{"status": "pending", "n": n} for n in range(5)]))
+    run(collection.update_one({"n": 2}, {"$set": {"status": "assigned"}}))
+
+    pending = run(collection.find({"status": "pending"}).to_list())
+    assert sorted(document["n"] for document in pending) == [0, 1, 3, 4]
+    assert run(collection.count_documents({"status": {"$in": ["assigned"]}})) == 1
+
+def test_sort_orders_mixed_types_like_mongo():
+    collection = MemoryCollection("mixed")
+    values = [True, "b", 3, None, {"a": 1}, ObjectId(), datetime(2024, 1, 1), 1.5]
+    run(collection.insert_many([{"rank": rank, "value": value} for rank, value in enumerate(values)]))
+    run(collection.insert_one({"rank": 8}))
+
+    ascending = run(collection.find(sort=[("value", 1)]).to_list())
+    assert [document["rank"] for document in ascending] == [3, 8, 7, 2, 1, 4, 5, 0, 6]
+    descending = run(collection.find(sort=[("value", -1)]).to_list())
+    assert [document["rank"] for document in descending] == [6, 0, 5, 4, 1, 2, 7, 3, 8]
+
+# Projections
+
+def test_projection_includes_fields_and_keeps_id():
+    assert _project(PLANT, {"title": 1, "attributes.light": 1}) == {
+        "_id": 1,
+        "title": "Supertunia",
+        "attributes": {"light": "Full Sun"},
+    }
+
+def test_projection_excludes_fields():
+    projected = _project(PLANT, {"items": 0, "attributes.usda_zone": 0, "_id": 0})
+    assert "_id" not in projected and "items" not in projected
+    assert projected["attributes"] == {"light": "Full Sun"}
+
+def test_projection_through_arrays_and_copies():
+    projected = _project(PLANT, {"items.product_id": 1, "_id": 0})
+    assert projected == {"items": [{"product_id": "a"}, {"product_id": "b"}]}
+    projected["items"][0]["product_id"] = "changed"
+    assert PLANT["items"][0]["product_id"] == "a"
+
+# Updates
+
+def test_inc_existing_and_missing_fields():
+    collection = MemoryCollection("products")
+    run(collection.insert_one({"_id": 1, "stock": 10}))
+
+    result = run(collection.update_one({"_id": 1}, {"$inc": {"stock": -3, "sold.total": 3}}))
+    assert result.matched_count == 1 and result.modified_count == 1
+    assert run(collection.find_one({"_id": 1})) == {"_id": 1, "stock": 7, "sold": {"total": 3}}
+
+def test_update_reports_unmodified_documents():
+    collection = MemoryCollection("products")
+    run(collection.insert_one({"_id": 1, "status": "published"}))
+
+    result = run(collection.update_one({"_id": 1}, {"$set": {"status": "published"}}))
+    assert result.matched_count == 1 and result.modified_count == 0
+
+def test_upsert_seeds_document_from_filter():
+    collection = MemoryCollection("shipping_rules", ["location"])
+
+    result = run(collection.update_one(
+        {"location": "dhaka", "active": {"$eq": True}, "base_cost": {"$gt": 0}},
+        {"$set": {"base_cost": 80.0}, "$setOnInsert": {"created": True}},
+        upsert=True
+    ))
+    assert result.upserted_id is not None and result.matched_count == 0
+    document = run(collection.find_one({"location": "dhaka"}))
+    assert document == {"_id": result.upserted_id, "location": "dhaka", "active": True, "base_cost": 80.0, "created": True}
+
+    # A second upsert matches, so $setOnInsert no longer applies
+    run(collection.update_one({"location": "dhaka"}, {"$set": {"base_cost": 90.0}, "$setOnInsert": {"created": False}}, upsert=True))
+    assert run(collection.count_documents({})) == 1
+    assert run(collection.find_one({"location": "dhaka"}))["created"] is True
+
+def test_replace_upsert_keeps_filter_id():
+    collection = MemoryCollection("related_products")
+    document_id = ObjectId()
+
+    run(collection.replace_one({"_id": document_id}, {"product_id": "a"}, upsert=True))
+    run(collection.replace_one({"_id": document_id}, {"product_id": "b"}, upsert=True))
+    assert run(collection.find().to_list()) == [{"_id": document_id, "product_id": "b"}]
+
+# Unique indexes and bulk writes
+
+def test_unique_index_rejects_duplicates_with_server_code():
+    collection = MemoryCollection("related_products")
+    run(collection.create_index("product_id", unique=True))
+    run(collection.insert_one({"product_id": "a"}))
+
+    with pytest.raises(DuplicateKeyError) as error:
+        run(collection.insert_one({"product_id": "a"}))
+    assert error.value.code == DUPLICATE_KEY
+    with pytest.raises(DuplicateKeyError):
+        run(collection.insert_one({"_id": run(collection.find_one())["_id"], "product_id": "b"}))
+
+def test_failed_update_keeps_previous_document_indexed():
+    collection = MemoryCollection("related_products")
+    run(collection.create_index("product_id", unique=True))
+    run(collection.insert_many([{"_id": 1, "product_id": "a"}, {"_id": 2, "product_id": "b"}]))
+
+    with pytest.raises(DuplicateKeyError):
+        run(collection.update_one({"_id": 2}, {"$set": {"product_id": "a"}}))
+    assert run(collection.find_one({"product_id": "b"})) == {"_id": 2, "product_id": "b"}
+
+def _bulk_requests():
+    return [
+        InsertOne({"_id": 1, "n": 1}),
+        InsertOne({"_id": 1, "n": 2}),
+        UpdateOne({"_id": 1}, {"$inc": {"n": 10}}),
+        ReplaceOne({"_id": 3}, {"n": 3}, upsert=True),
+    ]
+
+def test_ordered_bulk_write_stops_at_first_error():
+    collection = MemoryCollection("orders")
+    with pytest.raises(BulkWriteError) as error:
+        run(collection.bulk_write(_bulk_requests(), ordered=True))
+
+    details = error.value.details
+    assert [(entry["index"], entry["code"]) for entry in details["writeErrors"]] == [(1, DUPLICATE_KEY)]
+    assert details["nInserted"] == 1 and details["nModified"] == 0 and details["nUpserted"] == 0
+    assert run(collection.find().to_list()) == [{"_id": 1, "n": 1}]
+
+def test_unordered_bulk_write_runs_every_request():
+    collection = MemoryCollection("orders")
+    with pytest.raises(BulkWriteError) as error:
+        run(collection.bulk_write(_bulk_requests(), ordered=False))
+
+    details = error.value.details
+    assert [(entry["index"], entry["code"]) for entry in details["writeErrors"]] == [(1, DUPLICATE_KEY)]
+    assert details["nInserted"] == 1 and details["nModified"] == 1 and details["nUpserted"] == 1
+    assert details["upserted"] == [{"index": 3, "_id": 3}]
+    assert run(collection.find(sort=[("_id", 1)]).to_list()) == [{"_id": 1, "n": 11}, {"_id": 3, "n": 3}]
+
+def test_bulk_write_result_counts():
+    collection = MemoryCollection("deliveries", ["status"])
+    run(collection.insert_many([{"_id": n, "status": "pending"} for n in range(3)]))
+
+    result = run(collection.bulk_write([
+        UpdateOne({"_id": n, "status": "pending"}, {"$set": {"status": "assigned"}}) for n in (0, 1, 1, 5)
+    ], ordered=False))
+    assert result.matched_count == 2 and result.modified_count == 2
+    assert run(collection.count_documents({"status": "pending"})) == 1
+
+# Snapshots
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "snapshot.bson")
+    backend = MemoryBackend(path)
+    database = backend.get_database()
+    product_id = run(database.products.insert_one({"slug": "supertunia", "price": 250.5, "tags": ["a", "b"]})).inserted_id
+    run(database.related_products.create_index("product_id", unique=True))
+    run(database.related_products.insert_one({"product_id": str(product_id), "related": [{"score": 0.5}]}))
+    run(database.widgets.create_index("sku"))
+    backend.close()
+
+    restored = MemoryBackend(path).get_database()
+    assert run(restored.products.find_one({"slug": "supertunia"})) == {
+        "_id": product_id, "slug": "supertunia", "price": 250.5, "tags": ["a", "b"],
+    }
+    assert run(restored.related_products.count_documents({"product_id": str(product_id)})) == 1
+    assert "sku" in restored.widgets.indexes
+    # The unique index came back with the data
+    with pytest.raises(DuplicateKeyError):
+        run(restored.related_products.insert_one({"product_id": str(product_id)}))
+
+# Backends
+
+def test_backends_must_provide_a_database():
+    class Incomplete(StorageBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+    assert MemoryBackend().get_database() is not None
@@ -26,6 +26,15 @@ export interface Product {
   updated_at?: string
 }
 
+export interface RelatedProduct {
+  product_id: string
+  title: string
+  slug: string
+  price: number
+  image?: string
+  score: number
+}
+
 export const useProducts = () => {
   const [products, setProducts] = useState<Product[]>([])
   const [loading, setLoading] = useState(true)
@@ -91,4 +100,40 @@ export const useProduct = (productId: string) => {
   }, [productId])
 
   return { product, loading, error }
+}
+
+export const useRelatedProducts = (productId: string) => {
+  const [relatedProducts, setRelatedProducts] = useState<RelatedProduct[]>([])
+  const [loading, setLoading] = useState(true)
+  const [error, setError] = useState<string | null>(null)
+
+  useEffect(() => {
+    const fetchRelatedProducts = async () => {
+      if (!productId) {
+        setLoading(false)
+        return
+      }
+
+      try {
+        setLoading(true)
+        const response = await apiClient.getRelatedProducts(productId)
+        
+        if (response.error) {
+          throw new Error(response.error)
+        }
+        
+        setRelatedProducts(response.data || [])
+        setError(null)
+      } catch (err) {
+        const appError = handleApiError(err)
+        setError(appError.message)
+      } finally {
+        setLoading(false)
+      }
+    }
+
+    fetchRelatedProducts()
+  }, [productId])
+
+  return { relatedProducts, loading, error }
 }
\ No newline at end of file
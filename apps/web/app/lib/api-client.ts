@@ -55,6 +55,18 @@ export class ApiClient {
     return this.request(`/products/${id}`)
   }
 
+  async getRelatedProducts(id: string) {
+    return this.request(`/products/${id}/related`)
+  }
+
+  // Cart endpoints
+  async getCartQuote(items: { product_id: string; quantity: number }[], shippingLocation: string) {
+    return this.request('/cart/quote', {
+      method: 'POST',
+      body: JSON.stringify({ items, shipping_location: shippingLocation }),
+    })
+  }
+
   // Order endpoints
   async getOrders() {
     return this.request('/orders')
@@ -92,6 +104,15 @@ export class ApiClient {
     return this.request(`/deliveries/order/${orderId}`)
   }
 
+  // Status event streams (consume with EventSource)
+  getOrderEventsUrl(orderId: string) {
+    return `${this.baseUrl}/events/orders/${orderId}`
+  }
+
+  getUserEventsUrl(userId: string) {
+    return `${this.baseUrl}/events/users/${userId}`
+  }
+
   // Finance endpoints
   async getFinanceData() {
     return this.request('/finance')